@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Triathlon Training Service plan generation path.
+
+Runs in-process against a temporary SQLite database, no server required:
+
+    python benchmark.py bulk-insert
+    python benchmark.py engine
+    python benchmark.py concurrency   # requires httpx
+    python benchmark.py formats
+    python benchmark.py zones
+    python benchmark.py api --output results.json --baseline baseline.json   # requires httpx
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# main.py creates its tables on import, so point it at a scratch database first
+_workdir = tempfile.mkdtemp(prefix="triathlon-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'benchmark.db')}"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+
+PLAN_WEEKS = (4, 16, 52)
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _fresh_user(db, uin):
+    user = main.User(uin=uin)
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def bench_bulk_insert(repeat):
+    """Compare per-object ORM inserts with the executemany bulk path"""
+    main.bootstrap()
+    db = main.SessionLocal()
+    try:
+        print(f"{'weeks':>5} {'mode':>6} {'median ms':>10} {'min ms':>8}")
+        for weeks in PLAN_WEEKS:
+            competition_date = date.today() + timedelta(weeks=weeks)
+            for mode, bulk in (("orm", False), ("bulk", True)):
+                user_id = _fresh_user(db, f"bench-{mode}-{weeks}")
+                samples = _timed(
+                    lambda: main.generate_training_plan(user_id, competition_date, 850, db, bulk_insert=bulk),
+                    repeat,
+                )
+                print(f"{weeks:>5} {mode:>6} {statistics.median(samples) * 1000:>10.2f} {min(samples) * 1000:>8.2f}")
+    finally:
+        db.close()
+
+
+def _reference_plan(start_date, competition_date, difficulty, index):
+    """Scalar day-by-day computation the engine has to reproduce exactly"""
+    weeks_out = main.calculate_weeks_until_competition(competition_date, start_date)
+    template = index.lookup(difficulty, weeks_out)
+    rows = []
+    current_date = start_date
+    while current_date < competition_date:
+        factor = main.SUNDAY_FACTOR if current_date.weekday() == 6 else 1.0
+        rows.append((current_date, *main._daily_hours(template, factor)))
+        current_date += timedelta(days=1)
+    return rows
+
+
+def bench_engine(repeat):
+    """Throughput of the DB-free plan engine, checked against the scalar reference"""
+    index = main.bootstrap()
+
+    rng = random.Random(42)
+    today = date.today()
+    cases = [
+        (today + timedelta(days=rng.randrange(7)), rng.randrange(1, 400), rng.randrange(1001))
+        for _ in range(2000)
+    ]
+    for start_date, days, difficulty in cases[:200]:
+        competition_date = start_date + timedelta(days=days)
+        columns = main.compute_training_plan(start_date, competition_date, difficulty, index)
+        assert list(zip(*columns)) == _reference_plan(start_date, competition_date, difficulty, index)
+
+    for label, fn in (("engine", main.compute_training_plan), ("reference", _reference_plan)):
+        samples = _timed(
+            lambda: [fn(s, s + timedelta(days=n), d, index) for s, n, d in cases],
+            max(1, repeat // 4),
+        )
+        best = min(samples)
+        print(f"{label:>9}: {len(cases) / best:>10.0f} plans/s")
+
+
+def bench_concurrency(repeat, writers=4):
+    """Latency of GET /training-plan/{uin} while large POSTs run concurrently"""
+    import httpx
+
+    main.bootstrap()
+    today = date.today()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/training-plan", json={
+                "uin": "reader", "competition_date": (today + timedelta(weeks=4)).isoformat(), "difficulty": 500,
+            })
+            stop = asyncio.Event()
+
+            async def writer(number):
+                while not stop.is_set():
+                    await client.post("/training-plan", json={
+                        "uin": f"writer-{number}",
+                        "competition_date": (today + timedelta(weeks=52)).isoformat(),
+                        "difficulty": 900,
+                    })
+
+            async def reader(count):
+                samples = []
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = await client.get("/training-plan/reader")
+                    response.raise_for_status()
+                    samples.append(time.perf_counter() - started)
+                return samples
+
+            idle = await reader(repeat * 5)
+            tasks = [asyncio.create_task(writer(number)) for number in range(writers)]
+            busy = await reader(repeat * 5)
+            stop.set()
+            await asyncio.gather(*tasks)
+            return idle, busy
+
+    idle, busy = asyncio.run(run())
+    print(f"{'GET latency':>20} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, samples in (("idle", idle), (f"{writers} writers", busy)):
+        print(f"{label:>20} {_percentile(samples, 50) * 1000:>8.2f} {_percentile(samples, 99) * 1000:>8.2f}")
+
+
+def _json_plan_body(training_plan, days):
+    """Serialization of the default application/json plan representation"""
+    return main.TrainingPlanResponse(
+        id=training_plan.id,
+        competition_date=training_plan.competition_date,
+        difficulty=training_plan.difficulty,
+        training_days=[
+            main.TrainingDayResponse(
+                date=day, swimming_hours=swimming, cycling_hours=cycling, running_hours=running, total_hours=total
+            )
+            for day, swimming, cycling, running, total in days
+        ],
+    ).model_dump_json().encode()
+
+
+def bench_formats(repeat):
+    """Payload size and serialization time of a plan in each negotiated representation"""
+    main.bootstrap()
+    db = main.SessionLocal()
+    try:
+        print(f"{'weeks':>5} {'media type':>45} {'bytes':>8} {'median ms':>10}")
+        for weeks in PLAN_WEEKS:
+            user_id = _fresh_user(db, f"bench-formats-{weeks}")
+            training_plan = main.generate_training_plan(user_id, date.today() + timedelta(weeks=weeks), 650, db)
+            days = list(main.plan_days(db, training_plan))
+            for media_type in main.PLAN_MEDIA_TYPES:
+                if media_type == main.PLAN_JSON:
+                    encode = lambda: _json_plan_body(training_plan, days)
+                else:
+                    encode = lambda: main.encode_plan(training_plan, days, None, media_type)
+                size = len(encode())
+                samples = _timed(encode, repeat)
+                print(f"{weeks:>5} {media_type:>45} {size:>8} {statistics.median(samples) * 1000:>10.3f}")
+    finally:
+        db.close()
+
+
+def bench_zones(repeat):
+    """Cost of the zone prescription for a whole plan next to generating that plan"""
+    main.bootstrap()
+    table = main.get_zone_table()
+    db = main.SessionLocal()
+    try:
+        print(f"{'weeks':>5} {'generate ms':>12} {'zones ms':>9} {'overhead':>9}")
+        for weeks in PLAN_WEEKS:
+            competition_date = date.today() + timedelta(weeks=weeks)
+            user_id = _fresh_user(db, f"bench-zones-{weeks}")
+            generate = _timed(lambda: main.generate_training_plan(user_id, competition_date, 650, db), repeat)
+            days = list(zip(*main.compute_training_plan(date.today(), competition_date, 650)))
+            zones = _timed(lambda: main.prescribe_zones(days, competition_date, 650, table), repeat)
+            generate_ms = statistics.median(generate) * 1000
+            zones_ms = statistics.median(zones) * 1000
+            print(f"{weeks:>5} {generate_ms:>12.2f} {zones_ms:>9.3f} {zones_ms / generate_ms:>9.1%}")
+    finally:
+        db.close()
+
+
+API_WEEKS = (1, 4, 16, 52)
+API_CONCURRENCY = (1, 4, 16, 64)
+
+
+async def _drive(client, requests, concurrency):
+    """Send (method, url, json) requests from concurrency tasks; per-request latencies and wall time"""
+    pending = iter(requests)
+    samples = []
+
+    async def worker():
+        for method, url, body in pending:
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            samples.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def _api_result(operation, weeks, concurrency, samples, wall):
+    return {
+        "operation": operation,
+        "weeks": weeks,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "throughput": round(len(samples) / wall, 1),
+        "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(_percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 3),
+    }
+
+
+def _regressions(results, baseline, tolerance):
+    """Results slower than the baseline by more than tolerance, as (result, reason) pairs"""
+    previous = {(r["operation"], r["weeks"], r["concurrency"]): r for r in baseline["results"]}
+    flagged = []
+    for result in results:
+        reference = previous.get((result["operation"], result["weeks"], result["concurrency"]))
+        if reference is None:
+            continue
+        if result["throughput"] < reference["throughput"] * (1 - tolerance):
+            flagged.append((result, f"throughput {reference['throughput']:.1f} -> {result['throughput']:.1f}/s"))
+        elif result["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            flagged.append((result, f"p95 {reference['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms"))
+    return flagged
+
+
+def bench_api(requests, weeks, concurrency, output=None, baseline=None, tolerance=0.2):
+    """Throughput and latency percentiles of create, get and delete over the HTTP API"""
+    import httpx
+
+    main.bootstrap()
+    today = date.today()
+
+    async def run():
+        results = []
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for plan_weeks in weeks:
+                competition_date = (today + timedelta(weeks=plan_weeks)).isoformat()
+                for tasks in concurrency:
+                    uins = [f"api-{plan_weeks}-{tasks}-{number}" for number in range(requests)]
+                    phases = (
+                        ("create", [
+                            ("POST", "/training-plan", {"uin": uin, "competition_date": competition_date, "difficulty": 500})
+                            for uin in uins
+                        ]),
+                        ("get", [("GET", f"/training-plan/{uin}", None) for uin in uins]),
+                        ("delete", [("DELETE", f"/training-plan/{uin}", None) for uin in uins]),
+                    )
+                    for operation, calls in phases:
+                        samples, wall = await _drive(client, calls, tasks)
+                        results.append(_api_result(operation, plan_weeks, tasks, samples, wall))
+        return results
+
+    results = asyncio.run(run())
+
+    print(f"{'operation':>9} {'weeks':>5} {'tasks':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(
+            f"{r['operation']:>9} {r['weeks']:>5} {r['concurrency']:>5} {r['throughput']:>9.1f}"
+            f" {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}"
+        )
+
+    if output:
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "plan_storage": main.PLAN_STORAGE,
+            "requests": requests,
+            "results": results,
+        }
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if baseline:
+        with open(baseline) as f:
+            flagged = _regressions(results, json.load(f), tolerance)
+        for result, reason in flagged:
+            print(f"REGRESSION {result['operation']} weeks={result['weeks']} tasks={result['concurrency']}: {reason}")
+        if flagged:
+            sys.exit(1)
+        print(f"no regressions beyond {tolerance:.0%} of {baseline}")
+
+
+def _int_list(value):
+    return tuple(int(item) for item in value.split(","))
+
+
+BENCHMARKS = {
+    "bulk-insert": bench_bulk_insert,
+    "engine": bench_engine,
+    "concurrency": bench_concurrency,
+    "formats": bench_formats,
+    "zones": bench_zones,
+    "api": bench_api,
+}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    for name in ("bulk-insert", "engine", "concurrency", "formats", "zones"):
+        subparser = subparsers.add_parser(name, help=BENCHMARKS[name].__doc__)
+        subparser.add_argument("--repeat", type=int, default=20, help="runs per measurement")
+    api = subparsers.add_parser("api", help=bench_api.__doc__)
+    api.add_argument("--requests", type=int, default=200, help="plans per operation, plan length and concurrency")
+    api.add_argument("--weeks", type=_int_list, default=API_WEEKS, help="comma-separated plan lengths in weeks")
+    api.add_argument("--concurrency", type=_int_list, default=API_CONCURRENCY, help="comma-separated numbers of concurrent clients")
+    api.add_argument("--output", help="write results as JSON to this file")
+    api.add_argument("--baseline", help="JSON results of an earlier run; exit with status 1 on regressions")
+    api.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline (0.2 = 20%%)")
+    args = vars(parser.parse_args())
+    BENCHMARKS[args.pop("benchmark")](**args)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -51,15 +51,13 @@ def example_create_intermediate_plan():
         plan = response.json()
         print(f"✅ План создан! ID: {plan['id']}")
         
-        # Показать распределение по видам спорта
-        total_swim = sum(day['swimming_hours'] for day in plan['training_days'])
-        total_bike = sum(day['cycling_hours'] for day in plan['training_days'])
-        total_run = sum(day['running_hours'] for day in plan['training_days'])
-        total = total_swim + total_bike + total_run
-        
-        print(f"🏊‍♂️ Плавание: {total_swim:.1f}ч ({total_swim/total*100:.1f}%)")
-        print(f"🚴‍♂️ Велосипед: {total_bike:.1f}ч ({total_bike/total*100:.1f}%)")
-        print(f"🏃‍♂️ Бег: {total_run:.1f}ч ({total_run/total*100:.1f}%)")
+        # Показать распределение по видам спорта по фазам периодизации
+        summary = requests.get(f"{BASE_URL}/training-plan/{data['uin']}/summary").json()
+        for phase in summary['phases']:
+            print(f"📆 Фаза за {phase['weeks_out']} нед. до старта ({phase['weeks']} нед.):")
+            print(f"  🏊‍♂️ Плавание: {phase['swimming_hours']:.1f}ч ({phase['swimming_percentage']:.1f}%)")
+            print(f"  🚴‍♂️ Велосипед: {phase['cycling_hours']:.1f}ч ({phase['cycling_percentage']:.1f}%)")
+            print(f"  🏃‍♂️ Бег: {phase['running_hours']:.1f}ч ({phase['running_percentage']:.1f}%)")
         
         return plan
     else:
@@ -82,12 +80,9 @@ def example_create_advanced_plan():
         plan = response.json()
         print(f"✅ План создан! ID: {plan['id']}")
         
-        # Показать пиковую неделю
-        weekly_hours = []
-        for i in range(0, len(plan['training_days']), 7):
-            week_days = plan['training_days'][i:i+7]
-            week_total = sum(day['total_hours'] for day in week_days)
-            weekly_hours.append(week_total)
+        # Показать пиковую неделю (недельные итоги считает сервер)
+        summary = requests.get(f"{BASE_URL}/training-plan/{data['uin']}/summary").json()
+        weekly_hours = [week['total_hours'] for week in summary['weeks']]
         
         max_week = max(weekly_hours) if weekly_hours else 0
         print(f"⚡ Максимальная недельная нагрузка: {max_week:.1f} часов")
@@ -0,0 +1,26 @@
+"""Gunicorn settings for running the service with several worker processes.
+
+    gunicorn -c gunicorn.conf.py main:app
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+accesslog = "-"
+
+# Import the app in the master so reference data is seeded once and the
+# read-only template index is built before the workers are forked
+preload_app = True
+
+def when_ready(server):
+    import main
+
+    main.bootstrap()
+    # Workers open their own connections instead of sharing the master's sockets
+    main.engine.dispose()
+    # Keep the preloaded objects out of the collector so the pages stay shared
+    gc.freeze()
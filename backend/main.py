@@ -1,16 +1,84 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date, ForeignKey, DateTime
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from sqlalchemy import create_engine, delete, event, func, insert, inspect, select, text, update, Column, Index, Integer, String, Float, Date, ForeignKey, DateTime, LargeBinary
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.pool import StaticPool
 from pydantic import BaseModel
 from datetime import date, datetime, timedelta
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+import csv
+import hashlib
+import hmac
+import io
+import json
+import math
+import multiprocessing
 import os
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # optional: application/x-msgpack plan responses
+    msgpack = None
 
 # Database setup
-SQLITE_DATABASE_URL = "sqlite:///./triathlon_training.db"
-engine = create_engine(SQLITE_DATABASE_URL, connect_args={"check_same_thread": False})
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./triathlon_training.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+def create_database_engine(url: str):
+    """Engine for the configured database with explicit pooling"""
+    url_obj = make_url(url)
+    options = {"pool_pre_ping": True}
+    if url_obj.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if url_obj.database in (None, "", ":memory:"):
+            # Every connection to an in-memory database is a separate, empty database; share
+            # one connection across the request threadpool so all threads see the same tables
+            return create_engine(url, poolclass=StaticPool, **options)
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return create_engine(url, **options)
+
+engine = create_database_engine(DATABASE_URL)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        # WAL lets readers proceed while a plan is being written; busy_timeout makes
+        # concurrent writers wait for the lock instead of failing with "database is locked"
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        # SQLite ignores foreign keys, including ON DELETE CASCADE, unless enabled per connection
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -19,6 +87,56 @@ app = FastAPI(title="Triathlon Training Service", description="Training plan ser
 # CORS configuration based on environment
 cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",")
 
+# Write training days with a single executemany instead of one ORM object per day
+BULK_INSERT_TRAINING_DAYS = os.getenv("BULK_INSERT_TRAINING_DAYS", "true").lower() in ("1", "true", "yes")
+
+# Number of training days fetched and written per chunk by streaming plan reads
+STREAM_CHUNK_DAYS = int(os.getenv("STREAM_CHUNK_DAYS", "256"))
+
+# Maximum number of entries accepted by POST /training-plans/batch
+MAX_BATCH_PLANS = int(os.getenv("MAX_BATCH_PLANS", "1000"))
+
+# POST /training-plan responses kept for replay under their Idempotency-Key, and the
+# seconds after which a key still marked in progress (its process died) is taken over
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+
+# Versioned periodization templates applied at startup when their version is new,
+# and reloadable at runtime through POST /periodization-templates/reload
+PERIODIZATION_TEMPLATES_FILE = os.getenv(
+    "PERIODIZATION_TEMPLATES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "periodization_templates.json")
+)
+# Required in X-Admin-Token by the endpoints that change templates, when set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Precomputed plan library: upcoming race dates (comma-separated YYYY-MM-DD) whose
+# plans are built ahead for every difficulty band, plus the given number of the most
+# common competition dates of stored plans
+PLAN_LIBRARY_RACES = [date.fromisoformat(race) for race in os.getenv("PLAN_LIBRARY_RACES", "").split(",") if race.strip()]
+PLAN_LIBRARY_POPULAR_RACES = int(os.getenv("PLAN_LIBRARY_POPULAR_RACES", "0"))
+
+# Background plan jobs (POST /training-plan?background=true): worker threads per
+# process, jobs claimed at a time, seconds between polls for jobs queued by other
+# processes, and seconds after which a job left running by a dead process is retried
+PLAN_JOB_WORKERS = int(os.getenv("PLAN_JOB_WORKERS", "2"))
+PLAN_JOB_BATCH_SIZE = int(os.getenv("PLAN_JOB_BATCH_SIZE", "16"))
+PLAN_JOB_POLL_SECONDS = float(os.getenv("PLAN_JOB_POLL_SECONDS", "1.0"))
+PLAN_JOB_TIMEOUT_SECONDS = int(os.getenv("PLAN_JOB_TIMEOUT_SECONDS", "600"))
+
+# Upper bound on the number of days held by the computed plan cache
+PLAN_CACHE_MAX_DAYS = int(os.getenv("PLAN_CACHE_MAX_DAYS", "200000"))
+
+# Upper bound on the size of serialized plan responses kept for GET /training-plan/{uin}
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Storage of new plans: "rows" keeps one training_days row per day, "lazy" keeps only
+# the plan parameters and overridden days and computes the other days on read,
+# "packed" keeps all hours of a plan in one fixed-point blob on the plan row
+PLAN_STORAGE_MODES = ("rows", "lazy", "packed")
+PLAN_STORAGE = os.getenv("PLAN_STORAGE", "rows")
+if PLAN_STORAGE not in PLAN_STORAGE_MODES:
+    raise ValueError(f"PLAN_STORAGE must be one of {', '.join(PLAN_STORAGE_MODES)}")
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,6 +146,172 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request instrumentation: Server-Timing headers and Prometheus metrics at /metrics.
+# Metrics are kept per process; with several workers each one reports its own.
+
+# Bucket upper bounds of the exported histograms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+class Histogram:
+    """Prometheus histogram with one series per combination of label values"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if position < len(self.buckets):
+                series[position] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for label_values, series in series_items:
+            labels = ",".join(f'{name}="{prometheus_escape(value)}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+def prometheus_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Time to handle a request.", ("method", "route", "status"), LATENCY_BUCKETS
+)
+request_statements = Histogram(
+    "http_request_sql_statements", "SQL statements executed per request.", ("method", "route"), STATEMENT_BUCKETS
+)
+phase_seconds = Histogram(
+    "phase_duration_seconds", "Time spent in instrumented phases of request handling.", ("phase",), LATENCY_BUCKETS
+)
+
+class RequestTrace:
+    """Phase durations and SQL statements of the request being handled"""
+
+    __slots__ = ("phases", "statements", "db_seconds")
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.statements = 0
+        self.db_seconds = 0.0
+
+    def server_timing(self, total_seconds: float) -> str:
+        metrics = [f"total;dur={total_seconds * 1000:.3f}"]
+        metrics.append(f'db;dur={self.db_seconds * 1000:.3f};desc="statements={self.statements}"')
+        metrics.extend(f"{phase};dur={seconds * 1000:.3f}" for phase, seconds in self.phases.items())
+        return ", ".join(metrics)
+
+# Set by TimingMiddleware; copied into the threads that run sync endpoints
+_request_trace: "ContextVar[Optional[RequestTrace]]" = ContextVar("request_trace", default=None)
+
+def record_phase(phase: str, seconds: float) -> None:
+    phase_seconds.observe(seconds, phase)
+    trace = _request_trace.get()
+    if trace is not None:
+        trace.phases[phase] = trace.phases.get(phase, 0.0) + seconds
+
+@contextmanager
+def span(phase: str):
+    """Time the enclosed block as phase of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+@event.listens_for(engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["statement_started"].pop()
+    trace = _request_trace.get()
+    if trace is not None:
+        trace.statements += 1
+        trace.db_seconds += seconds
+
+@event.listens_for(engine, "handle_error")
+def _discard_failed_statement(exception_context):
+    started = exception_context.connection.info.get("statement_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+@event.listens_for(Session, "before_commit")
+def _start_commit(session):
+    session.info["commit_started"] = time.perf_counter()
+
+@event.listens_for(Session, "after_commit")
+def _finish_commit(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        record_phase("commit", time.perf_counter() - started)
+
+@event.listens_for(Session, "after_rollback")
+def _abandon_commit(session):
+    session.info.pop("commit_started", None)
+
+def route_template(scope) -> str:
+    """Path template of the route handling scope, so metrics are not labelled per uin"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+class TimingMiddleware:
+    """Adds a Server-Timing header to every response and records request metrics"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = RequestTrace()
+        token = _request_trace.set(trace)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", trace.server_timing(time.perf_counter() - started)
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_trace.reset(token)
+            route = route_template(scope)
+            request_seconds.observe(time.perf_counter() - started, scope["method"], route, str(status))
+            request_statements.observe(trace.statements, scope["method"], route)
+
+app.add_middleware(TimingMiddleware)
+
 # Database Models
 class User(Base):
     __tablename__ = "users"
@@ -46,15 +330,22 @@ class TrainingPlan(Base):
     competition_date = Column(Date, nullable=False)
     difficulty = Column(Integer, nullable=False)  # 0-1000
     created_at = Column(DateTime, default=datetime.utcnow)
+    start_date = Column(Date)  # first day of the plan
+    template_version = Column(String)  # periodization index version the days were computed with
+    storage = Column(String, default="rows")  # rows, lazy, packed
+    # packed storage: swimming, cycling, running and total hours of each day from
+    # start_date as four consecutive little-endian int16 arrays of centi-hours
+    packed_days = Column(LargeBinary)
     
     user = relationship("User", back_populates="training_plans")
-    training_days = relationship("TrainingDay", back_populates="training_plan")
+    # Days and week summaries are removed by the database (ON DELETE CASCADE), never loaded for it
+    training_days = relationship("TrainingDay", back_populates="training_plan", passive_deletes=True)
 
 class TrainingDay(Base):
     __tablename__ = "training_days"
     
     id = Column(Integer, primary_key=True, index=True)
-    training_plan_id = Column(Integer, ForeignKey("training_plans.id"))
+    training_plan_id = Column(Integer, ForeignKey("training_plans.id", ondelete="CASCADE"))
     date = Column(Date, nullable=False)
     swimming_hours = Column(Float, default=0.0)
     cycling_hours = Column(Float, default=0.0)
@@ -62,6 +353,28 @@ class TrainingDay(Base):
     total_hours = Column(Float, default=0.0)
     
     training_plan = relationship("TrainingPlan", back_populates="training_days")
+    
+    __table_args__ = (
+        Index("ix_training_days_plan_date", "training_plan_id", "date"),
+    )
+
+# Per-week totals of a plan, rewritten for the affected weeks whenever its days change
+class PlanWeekSummary(Base):
+    __tablename__ = "plan_week_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    training_plan_id = Column(Integer, ForeignKey("training_plans.id", ondelete="CASCADE"))
+    week_start = Column(Date, nullable=False)  # Monday
+    weeks_out = Column(Integer)  # periodization phase of the week, see periodization_phase
+    days = Column(Integer, nullable=False)
+    swimming_hours = Column(Float, default=0.0)
+    cycling_hours = Column(Float, default=0.0)
+    running_hours = Column(Float, default=0.0)
+    total_hours = Column(Float, default=0.0)
+    
+    __table_args__ = (
+        Index("ix_plan_week_summaries_plan_week", "training_plan_id", "week_start", unique=True),
+    )
 
 # Training zones and periodization data based on Joe Friel's methodology
 class TrainingZones(Base):
@@ -85,6 +398,75 @@ class PeriodizationTemplate(Base):
     running_percentage = Column(Float, nullable=False)
     total_hours_per_week = Column(Float, nullable=False)
 
+# Outcome of a POST /training-plan sent with an Idempotency-Key; status_code is
+# NULL while the request is being handled
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)  # hash of the request it was first used with
+    status_code = Column(Integer)
+    body = Column(LargeBinary)
+    media_type = Column(String)
+    location = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+# Labelled template sets that have been applied; fingerprint is the PeriodizationIndex.version
+# of their templates, which plans record in template_version
+class PeriodizationVersion(Base):
+    __tablename__ = "periodization_versions"
+    
+    version = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    source = Column(String)  # templates file path or "api"
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class DataSeed(Base):
+    __tablename__ = "data_seeds"
+    
+    name = Column(String, primary_key=True)  # one row per seeded data set
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Hours of a plan for a popular race and difficulty band, built ahead by precompute_plan_library
+class PlanLibraryEntry(Base):
+    __tablename__ = "plan_library"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    race_date = Column(Date, nullable=False)
+    difficulty_min = Column(Integer, nullable=False)
+    difficulty_max = Column(Integer, nullable=False)
+    start_date = Column(Date, nullable=False)  # first day of packed_days
+    template_version = Column(String, nullable=False)
+    weeks_out = Column(Integer)  # weeks_out of the template the days were computed from
+    packed_days = Column(LargeBinary, nullable=False)  # same layout as TrainingPlan.packed_days
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_plan_library_race_difficulty", "race_date", "difficulty_min"),
+    )
+
+# Plan generation requested with background=true, processed by the in-process job pool
+class PlanJob(Base):
+    __tablename__ = "plan_jobs"
+    
+    id = Column(String, primary_key=True)  # uuid4 hex
+    uin = Column(String, nullable=False, index=True)
+    competition_date = Column(Date, nullable=False)
+    difficulty = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    submissions = Column(Integer, nullable=False, default=1)  # requests coalesced into this job
+    claim = Column(String)  # token of the worker thread running the job
+    plan_id = Column(Integer)
+    training_days = Column(Integer)
+    detail = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index("ix_plan_jobs_status_created", "status", "created_at"),
+    )
+
 # Pydantic models
 class UserCreate(BaseModel):
     uin: str
@@ -94,6 +476,26 @@ class TrainingPlanCreate(BaseModel):
     competition_date: date
     difficulty: int
 
+class BatchTrainingPlanCreate(BaseModel):
+    plans: List[TrainingPlanCreate]
+
+class PeriodizationTemplateData(BaseModel):
+    difficulty_min: int
+    difficulty_max: int
+    weeks_out: int
+    swimming_percentage: float
+    cycling_percentage: float
+    running_percentage: float
+    total_hours_per_week: float
+
+class PeriodizationTemplateSet(BaseModel):
+    version: str
+    templates: List[PeriodizationTemplateData]
+
+class PeriodizationTemplateSetResponse(PeriodizationTemplateSet):
+    fingerprint: str
+    created_at: Optional[datetime] = None
+
 class TrainingDayResponse(BaseModel):
     date: date
     swimming_hours: float
@@ -101,11 +503,316 @@ class TrainingDayResponse(BaseModel):
     running_hours: float
     total_hours: float
 
+class TrainingDayUpdate(BaseModel):
+    swimming_hours: float
+    cycling_hours: float
+    running_hours: float
+
 class TrainingPlanResponse(BaseModel):
     id: int
     competition_date: date
     difficulty: int
     training_days: List[TrainingDayResponse]
+    next_cursor: Optional[date] = None
+
+class TrainingDayZonesResponse(TrainingDayResponse):
+    zones: Dict[str, List[float]]  # sport -> hours in each zone, zone 1 first
+    load: float  # hours weighted by zone intensity
+
+class TrainingPlanZonesResponse(TrainingPlanResponse):
+    training_days: List[TrainingDayZonesResponse]
+
+class VolumeSummary(BaseModel):
+    days: int
+    swimming_hours: float
+    cycling_hours: float
+    running_hours: float
+    total_hours: float
+    swimming_percentage: float
+    cycling_percentage: float
+    running_percentage: float
+
+class WeekSummaryResponse(VolumeSummary):
+    week_start: date
+    weeks_out: Optional[int]
+
+class PhaseSummaryResponse(VolumeSummary):
+    weeks_out: Optional[int]
+    first_week: date
+    weeks: int
+
+class TrainingPlanSummaryResponse(BaseModel):
+    id: int
+    competition_date: date
+    difficulty: int
+    weeks: List[WeekSummaryResponse]
+    phases: List[PhaseSummaryResponse]
+
+class BatchPlanResult(BaseModel):
+    uin: str
+    status: str  # created, error
+    plan_id: Optional[int] = None
+    training_days: int = 0
+    detail: Optional[str] = None
+
+class BatchTrainingPlanResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchPlanResult]
+
+class PlanJobResponse(BaseModel):
+    id: str
+    uin: str
+    status: str  # queued, running, done, failed
+    competition_date: date
+    difficulty: int
+    submissions: int
+    plan_id: Optional[int] = None
+    training_days: Optional[int] = None
+    detail: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+# In-memory periodization template index
+class TemplateEntry(NamedTuple):
+    """Immutable copy of a PeriodizationTemplate row"""
+    difficulty_min: int
+    difficulty_max: int
+    weeks_out: int
+    swimming_percentage: float
+    cycling_percentage: float
+    running_percentage: float
+    total_hours_per_week: float
+
+class PeriodizationIndex:
+    """Immutable interval index over periodization templates.
+
+    The difficulty axis is split into disjoint segments at every band boundary;
+    each segment keeps the templates of all bands covering it sorted by weeks_out.
+    A lookup is a binary search for the segment followed by a binary search for
+    the largest weeks_out not greater than the requested one.
+    """
+
+    __slots__ = ("version", "_starts", "_ends", "_weeks", "_entries")
+
+    def __init__(self, entries: Iterable[TemplateEntry]):
+        entries = list(entries)
+        # Content fingerprint: plans computed with equal versions have equal days
+        self.version = hashlib.blake2b(repr(sorted(entries)).encode(), digest_size=8).hexdigest()
+        bounds = sorted({e.difficulty_min for e in entries} | {e.difficulty_max + 1 for e in entries})
+        starts, ends, weeks, segments = [], [], [], []
+        for lo, hi in zip(bounds, bounds[1:]):
+            covering = sorted(
+                (e for e in entries if e.difficulty_min <= lo and e.difficulty_max >= hi - 1),
+                key=lambda e: e.weeks_out,
+            )
+            if covering:
+                starts.append(lo)
+                ends.append(hi - 1)
+                weeks.append(tuple(e.weeks_out for e in covering))
+                segments.append(tuple(covering))
+        self._starts = tuple(starts)
+        self._ends = tuple(ends)
+        self._weeks = tuple(weeks)
+        self._entries = tuple(segments)
+
+    @classmethod
+    def from_db(cls, db: Session) -> "PeriodizationIndex":
+        rows = db.query(PeriodizationTemplate).all()
+        return cls(
+            TemplateEntry(
+                difficulty_min=row.difficulty_min,
+                difficulty_max=row.difficulty_max,
+                weeks_out=row.weeks_out,
+                swimming_percentage=row.swimming_percentage,
+                cycling_percentage=row.cycling_percentage,
+                running_percentage=row.running_percentage,
+                total_hours_per_week=row.total_hours_per_week,
+            )
+            for row in rows
+        )
+
+    def __len__(self) -> int:
+        return len({e for segment in self._entries for e in segment})
+
+    def bands(self) -> List[Tuple[int, int]]:
+        """Every difficulty segment, in order"""
+        return list(zip(self._starts, self._ends))
+
+    def band(self, difficulty: int) -> Optional[Tuple[int, int]]:
+        """Difficulty segment within which every difficulty gets the same templates"""
+        segment = bisect_right(self._starts, difficulty) - 1
+        if segment < 0 or difficulty > self._ends[segment]:
+            return None
+        return self._starts[segment], self._ends[segment]
+
+    def phases(self, difficulty: int) -> Tuple[int, ...]:
+        """weeks_out of every template of the difficulty band, ascending"""
+        segment = bisect_right(self._starts, difficulty) - 1
+        if segment < 0 or difficulty > self._ends[segment]:
+            return ()
+        return self._weeks[segment]
+
+    def lookup(self, difficulty: int, weeks_out: int) -> Optional[TemplateEntry]:
+        """Template with the largest weeks_out <= weeks_out for the difficulty band"""
+        segment = bisect_right(self._starts, difficulty) - 1
+        if segment < 0 or difficulty > self._ends[segment]:
+            return None
+        position = bisect_right(self._weeks[segment], weeks_out) - 1
+        if position < 0:
+            return None
+        return self._entries[segment][position]
+
+_periodization_index: Optional[PeriodizationIndex] = None
+_periodization_index_lock = threading.Lock()
+# Bumped whenever templates are committed. It lives in shared memory created at
+# import, so workers forked from a preloading master notice changes made by others
+_template_generation = multiprocessing.RawValue("q", 0)
+_template_generation_lock = multiprocessing.Lock()
+_periodization_index_generation = -1
+
+def reload_periodization_index(db: Optional[Session] = None) -> PeriodizationIndex:
+    """Rebuild the template index from the database and swap it in atomically"""
+    global _periodization_index, _periodization_index_generation
+    generation = _template_generation.value
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        with span("templates"):
+            index = PeriodizationIndex.from_db(db)
+    finally:
+        if own_session:
+            db.close()
+    with _periodization_index_lock:
+        previous = _periodization_index
+        if previous is not None and previous.version != index.version:
+            # Lazy plans cannot be recomputed once their templates are gone
+            materialize_lazy_plans(previous)
+        _periodization_index = index
+        _periodization_index_generation = generation
+        plan_cache.clear()
+    return index
+
+def get_periodization_index() -> PeriodizationIndex:
+    """Current template index, rebuilt on first use or after templates changed"""
+    index = _periodization_index
+    if index is None or _periodization_index_generation != _template_generation.value:
+        index = reload_periodization_index()
+    return index
+
+@event.listens_for(Session, "before_flush")
+def _track_template_changes(session, flush_context, instances):
+    if any(isinstance(obj, PeriodizationTemplate) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["periodization_templates_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _rebuild_index_on_template_commit(session):
+    if session.info.pop("periodization_templates_changed", False):
+        with _template_generation_lock:
+            _template_generation.value += 1
+        reload_periodization_index()
+        if plan_library_races_configured():
+            precompute_plan_library()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_template_changes(session):
+    session.info.pop("periodization_templates_changed", None)
+
+# In-memory training zone table
+SPORTS = ("swimming", "cycling", "running")
+
+# Share of a day's hours spent in zones 1-6 by periodization phase (see
+# periodization_phase): (fewest weeks_out, weights), checked in order. Aerobic base
+# first, threshold and VO2 max work closer to the race, mostly easy while tapering
+PHASE_ZONE_WEIGHTS = (
+    (12, (0.25, 0.60, 0.10, 0.05, 0.0, 0.0)),
+    (4, (0.15, 0.50, 0.15, 0.12, 0.06, 0.02)),
+    (2, (0.15, 0.45, 0.12, 0.15, 0.10, 0.03)),
+    (0, (0.30, 0.45, 0.10, 0.10, 0.04, 0.01)),
+)
+
+def zone_split(phase: Optional[int]) -> int:
+    """Position in PHASE_ZONE_WEIGHTS of the split used in a periodization phase"""
+    for split, (min_weeks, _) in enumerate(PHASE_ZONE_WEIGHTS):
+        if (phase or 0) >= min_weeks:
+            return split
+    return len(PHASE_ZONE_WEIGHTS) - 1
+
+class ZoneTable:
+    """Immutable copy of training_zones with the zone split of every sport and phase.
+
+    fractions(sport, split) are the PHASE_ZONE_WEIGHTS of the zones the sport
+    has, renormalized; intensity(sport, split) is the mean intensity of that
+    split, so hours times it give the intensity-weighted load.
+    """
+
+    __slots__ = ("zones", "_fractions", "_intensities")
+
+    def __init__(self, rows: Iterable[Tuple[str, int, float]]):
+        intensities: Dict[str, Dict[int, float]] = {}
+        for sport, zone, intensity in rows:
+            intensities.setdefault(sport, {})[zone] = intensity
+        self.zones = {sport: tuple(sorted(zones)) for sport, zones in intensities.items()}
+        self._fractions: Dict[Tuple[str, int], Tuple[float, ...]] = {}
+        self._intensities: Dict[Tuple[str, int], float] = {}
+        for sport, zones in self.zones.items():
+            for phase, (_, weights) in enumerate(PHASE_ZONE_WEIGHTS):
+                zone_weights = [weights[zone - 1] if 1 <= zone <= len(weights) else 0.0 for zone in zones]
+                total = sum(zone_weights)
+                fractions = tuple(weight / total for weight in zone_weights) if total else (0.0,) * len(zones)
+                self._fractions[sport, phase] = fractions
+                self._intensities[sport, phase] = sum(
+                    fraction * intensities[sport][zone] for fraction, zone in zip(fractions, zones)
+                )
+
+    @classmethod
+    def from_db(cls, db: Session) -> "ZoneTable":
+        return cls(db.execute(select(TrainingZones.sport, TrainingZones.zone, TrainingZones.intensity)).all())
+
+    def fractions(self, sport: str, split: int) -> Tuple[float, ...]:
+        return self._fractions.get((sport, split), ())
+
+    def intensity(self, sport: str, split: int) -> float:
+        return self._intensities.get((sport, split), 0.0)
+
+_zone_table: Optional[ZoneTable] = None
+# Bumped whenever training zones are committed, shared with forked workers like
+# _template_generation
+_zone_generation = multiprocessing.RawValue("q", 0)
+_zone_generation_lock = multiprocessing.Lock()
+_zone_table_generation = -1
+
+def get_zone_table() -> ZoneTable:
+    """Current zone table, loaded on first use or after zones changed"""
+    global _zone_table, _zone_table_generation
+    table = _zone_table
+    if table is None or _zone_table_generation != _zone_generation.value:
+        generation = _zone_generation.value
+        db = SessionLocal()
+        try:
+            with span("zones"):
+                table = ZoneTable.from_db(db)
+        finally:
+            db.close()
+        _zone_table, _zone_table_generation = table, generation
+    return table
+
+@event.listens_for(Session, "before_flush")
+def _track_zone_changes(session, flush_context, instances):
+    if any(isinstance(obj, TrainingZones) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["training_zones_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _reload_zones_on_commit(session):
+    if session.info.pop("training_zones_changed", False):
+        with _zone_generation_lock:
+            _zone_generation.value += 1
+
+@event.listens_for(Session, "after_rollback")
+def _discard_zone_changes(session):
+    session.info.pop("training_zones_changed", None)
 
 # Database dependency
 def get_db():
@@ -115,15 +822,77 @@ def get_db():
     finally:
         db.close()
 
+def upgrade_schema(bind) -> None:
+    """Add columns and indexes introduced after an existing database was created.
+
+    create_all only creates missing tables, so nullable columns added to a model
+    later are added here with ALTER TABLE.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+    for table in Base.metadata.sorted_tables:
+        for table_index in table.indexes:
+            table_index.create(bind=bind, checkfirst=True)
+
+def create_schema(bind, attempts: int = 3) -> None:
+    """Create and upgrade the schema, tolerating other processes doing the same"""
+    for attempt in range(attempts):
+        try:
+            Base.metadata.create_all(bind=bind)
+            upgrade_schema(bind)
+            return
+        except (OperationalError, ProgrammingError, IntegrityError):
+            # Another worker created a table or column between our check and our DDL
+            if attempt == attempts - 1:
+                raise
+
+def plan_deletes_cascade(bind) -> bool:
+    """Whether the database removes days and week summaries together with their plan.
+
+    Tables created before the foreign keys declared ON DELETE CASCADE keep their
+    old constraints (SQLite cannot alter them), so deletes there remove the
+    children explicitly.
+    """
+    inspector = inspect(bind)
+    for table in (TrainingDay.__table__, PlanWeekSummary.__table__):
+        foreign_keys = [
+            foreign_key for foreign_key in inspector.get_foreign_keys(table.name)
+            if foreign_key["referred_table"] == TrainingPlan.__tablename__
+        ]
+        if not foreign_keys or any(
+            (foreign_key.get("options") or {}).get("ondelete", "").upper() != "CASCADE" for foreign_key in foreign_keys
+        ):
+            return False
+    return True
+
 # Create tables
-Base.metadata.create_all(bind=engine)
+create_schema(engine)
+PLAN_DELETES_CASCADE = plan_deletes_cascade(engine)
 
-# Initialize training data
+# Initialize training data; periodization templates come from PERIODIZATION_TEMPLATES_FILE
 def init_training_data(db: Session):
     # Check if data already exists
     if db.query(TrainingZones).first() is not None:
         return
     
+    # Claim the seed before adding data: when several workers start at once the
+    # primary key lets only one of them insert, the others wait for its commit
+    # and then fail here instead of seeding the data a second time
+    db.add(DataSeed(name="training_data"))
+    try:
+        db.flush()
+    except (IntegrityError, OperationalError):
+        db.rollback()
+        if db.query(TrainingZones).first() is None:
+            raise
+        return
+    
     # Training zones data based on Joe Friel's methodology
     zones_data = [
         # Swimming zones
@@ -155,182 +924,1792 @@ def init_training_data(db: Session):
         zone = TrainingZones(**zone_data)
         db.add(zone)
     
-    # Periodization templates based on difficulty and weeks before competition
-    periodization_data = [
-        # Beginner level (0-300 difficulty)
-        {"difficulty_min": 0, "difficulty_max": 300, "weeks_out": 20, "swimming_percentage": 0.2, "cycling_percentage": 0.5, "running_percentage": 0.3, "total_hours_per_week": 6.0},
-        {"difficulty_min": 0, "difficulty_max": 300, "weeks_out": 16, "swimming_percentage": 0.25, "cycling_percentage": 0.45, "running_percentage": 0.3, "total_hours_per_week": 7.0},
-        {"difficulty_min": 0, "difficulty_max": 300, "weeks_out": 12, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 8.0},
-        {"difficulty_min": 0, "difficulty_max": 300, "weeks_out": 8, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 9.0},
-        {"difficulty_min": 0, "difficulty_max": 300, "weeks_out": 4, "swimming_percentage": 0.35, "cycling_percentage": 0.35, "running_percentage": 0.3, "total_hours_per_week": 8.0},
-        {"difficulty_min": 0, "difficulty_max": 300, "weeks_out": 2, "swimming_percentage": 0.4, "cycling_percentage": 0.3, "running_percentage": 0.3, "total_hours_per_week": 6.0},
-        {"difficulty_min": 0, "difficulty_max": 300, "weeks_out": 1, "swimming_percentage": 0.4, "cycling_percentage": 0.3, "running_percentage": 0.3, "total_hours_per_week": 4.0},
-        
-        # Intermediate level (301-700 difficulty)
-        {"difficulty_min": 301, "difficulty_max": 700, "weeks_out": 24, "swimming_percentage": 0.25, "cycling_percentage": 0.45, "running_percentage": 0.3, "total_hours_per_week": 10.0},
-        {"difficulty_min": 301, "difficulty_max": 700, "weeks_out": 20, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 12.0},
-        {"difficulty_min": 301, "difficulty_max": 700, "weeks_out": 16, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 14.0},
-        {"difficulty_min": 301, "difficulty_max": 700, "weeks_out": 12, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 15.0},
-        {"difficulty_min": 301, "difficulty_max": 700, "weeks_out": 8, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 16.0},
-        {"difficulty_min": 301, "difficulty_max": 700, "weeks_out": 4, "swimming_percentage": 0.35, "cycling_percentage": 0.35, "running_percentage": 0.3, "total_hours_per_week": 14.0},
-        {"difficulty_min": 301, "difficulty_max": 700, "weeks_out": 2, "swimming_percentage": 0.4, "cycling_percentage": 0.3, "running_percentage": 0.3, "total_hours_per_week": 10.0},
-        {"difficulty_min": 301, "difficulty_max": 700, "weeks_out": 1, "swimming_percentage": 0.4, "cycling_percentage": 0.3, "running_percentage": 0.3, "total_hours_per_week": 6.0},
-        
-        # Advanced level (701-1000 difficulty)
-        {"difficulty_min": 701, "difficulty_max": 1000, "weeks_out": 28, "swimming_percentage": 0.25, "cycling_percentage": 0.45, "running_percentage": 0.3, "total_hours_per_week": 15.0},
-        {"difficulty_min": 701, "difficulty_max": 1000, "weeks_out": 24, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 18.0},
-        {"difficulty_min": 701, "difficulty_max": 1000, "weeks_out": 20, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 20.0},
-        {"difficulty_min": 701, "difficulty_max": 1000, "weeks_out": 16, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 22.0},
-        {"difficulty_min": 701, "difficulty_max": 1000, "weeks_out": 12, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 24.0},
-        {"difficulty_min": 701, "difficulty_max": 1000, "weeks_out": 8, "swimming_percentage": 0.3, "cycling_percentage": 0.4, "running_percentage": 0.3, "total_hours_per_week": 25.0},
-        {"difficulty_min": 701, "difficulty_max": 1000, "weeks_out": 4, "swimming_percentage": 0.35, "cycling_percentage": 0.35, "running_percentage": 0.3, "total_hours_per_week": 20.0},
-        {"difficulty_min": 701, "difficulty_max": 1000, "weeks_out": 2, "swimming_percentage": 0.4, "cycling_percentage": 0.3, "running_percentage": 0.3, "total_hours_per_week": 15.0},
-        {"difficulty_min": 701, "difficulty_max": 1000, "weeks_out": 1, "swimming_percentage": 0.4, "cycling_percentage": 0.3, "running_percentage": 0.3, "total_hours_per_week": 8.0},
-    ]
-    
-    for period_data in periodization_data:
-        period = PeriodizationTemplate(**period_data)
-        db.add(period)
-    
     db.commit()
 
-# Initialize data on startup
-@app.on_event("startup")
-async def startup_event():
+# Hours in a week. It also keeps every day well within the int16 centi-hours of packed storage
+MAX_HOURS_PER_WEEK = 168
+
+def validate_template_set(template_set: PeriodizationTemplateSet) -> Optional[str]:
+    """Error message for an invalid template set, None when it is valid"""
+    if not template_set.version.strip():
+        return "version must not be empty"
+    if not template_set.templates:
+        return "At least one template is required"
+    seen = set()
+    for position, template in enumerate(template_set.templates):
+        where = f"Template {position}"
+        if not (0 <= template.difficulty_min <= template.difficulty_max <= 1000):
+            return f"{where}: difficulty range must lie within 0-1000"
+        if template.weeks_out < 1:
+            return f"{where}: weeks_out must be at least 1"
+        shares = (template.swimming_percentage, template.cycling_percentage, template.running_percentage)
+        if min(shares) < 0 or abs(sum(shares) - 1.0) > 0.001:
+            return f"{where}: sport percentages must be non-negative and add up to 1"
+        if not (0 < template.total_hours_per_week <= MAX_HOURS_PER_WEEK):
+            return f"{where}: total_hours_per_week must be positive and at most {MAX_HOURS_PER_WEEK}"
+        key = (template.difficulty_min, template.difficulty_max, template.weeks_out)
+        if key in seen:
+            return f"{where}: duplicate difficulty range and weeks_out"
+        seen.add(key)
+    return None
+
+def template_set_fingerprint(template_set: PeriodizationTemplateSet) -> str:
+    return PeriodizationIndex(TemplateEntry(**template.model_dump()) for template in template_set.templates).version
+
+def load_template_file(path: str = PERIODIZATION_TEMPLATES_FILE) -> PeriodizationTemplateSet:
+    with open(path, encoding="utf-8") as template_file:
+        return PeriodizationTemplateSet.model_validate(json.load(template_file))
+
+def template_version_conflict(db: Session, template_set: PeriodizationTemplateSet) -> Optional[str]:
+    """Error message when the version label was already applied with other templates"""
+    applied = db.get(PeriodizationVersion, template_set.version)
+    if applied is not None and applied.fingerprint != template_set_fingerprint(template_set):
+        return f"Version {template_set.version} was already applied with different templates"
+    return None
+
+def apply_template_set(db: Session, template_set: PeriodizationTemplateSet, source: str) -> bool:
+    """Replace the stored templates with a validated template set in one transaction.
+
+    The commit swaps in the new template index and drops what was derived from
+    the old one (computed plan cache, plan library). Returns False when the
+    version was already applied.
+    """
+    if db.get(PeriodizationVersion, template_set.version) is not None:
+        return False
+    # Built here rather than taken from the loaded index: at startup no index
+    # exists yet, and lazy plans must be stored before their templates are gone
+    materialize_lazy_plans(PeriodizationIndex.from_db(db))
+    db.execute(delete(PeriodizationTemplate), execution_options={"synchronize_session": False})
+    db.add_all(PeriodizationTemplate(**template.model_dump()) for template in template_set.templates)
+    db.add(PeriodizationVersion(
+        version=template_set.version, fingerprint=template_set_fingerprint(template_set), source=source
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker applied the same version at the same time
+        db.rollback()
+        return False
+    return True
+
+def apply_template_file(db: Session, path: str = PERIODIZATION_TEMPLATES_FILE) -> bool:
+    """Apply the templates file unless its version was already applied"""
+    template_set = load_template_file(path)
+    error = validate_template_set(template_set) or template_version_conflict(db, template_set)
+    if error:
+        raise ValueError(f"{path}: {error}")
+    return apply_template_set(db, template_set, path)
+
+def bootstrap() -> PeriodizationIndex:
+    """Seed reference data and build the template index unless already done.
+
+    Under gunicorn with preload_app the master calls this before forking, so the
+    workers start with the index already in (copy-on-write shared) memory.
+    """
+    if _periodization_index is not None:
+        return _periodization_index
     db = SessionLocal()
     try:
         init_training_data(db)
+        if os.path.exists(PERIODIZATION_TEMPLATES_FILE):
+            apply_template_file(db)
+        index = reload_periodization_index(db)
+        if not len(index):
+            # Every plan would silently fall back to FALLBACK_DAILY_HOURS
+            raise RuntimeError(
+                f"No periodization templates: {PERIODIZATION_TEMPLATES_FILE} does not exist and none are stored"
+            )
+        get_zone_table()
+        if plan_library_races_configured() and not plan_library_current(db, index):
+            precompute_plan_library(db)
+        return index
     finally:
         db.close()
 
-def calculate_weeks_until_competition(competition_date: date) -> int:
+# Initialize data on startup
+@app.on_event("startup")
+async def startup_event():
+    bootstrap()
+    # Started per worker process, never in a preloading master: threads do not survive fork
+    plan_jobs.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    plan_jobs.stop()
+
+def calculate_weeks_until_competition(competition_date: date, start_date: Optional[date] = None) -> int:
     """Calculate weeks until competition date"""
-    today = date.today()
+    today = start_date or date.today()
     days_until = (competition_date - today).days
     return max(1, days_until // 7)
 
-def get_periodization_template(difficulty: int, weeks_out: int, db: Session) -> Optional[PeriodizationTemplate]:
+def get_periodization_template(difficulty: int, weeks_out: int) -> Optional["TemplateEntry"]:
     """Get the appropriate periodization template based on difficulty and weeks out"""
-    template = db.query(PeriodizationTemplate).filter(
-        PeriodizationTemplate.difficulty_min <= difficulty,
-        PeriodizationTemplate.difficulty_max >= difficulty,
-        PeriodizationTemplate.weeks_out <= weeks_out
-    ).order_by(PeriodizationTemplate.weeks_out.desc()).first()
-    
-    return template
+    return get_periodization_index().lookup(difficulty, weeks_out)
+
+# Plan computation engine
+SUNDAY_FACTOR = 0.5
+TRAINING_DAYS_PER_WEEK = 6
+FALLBACK_DAILY_HOURS = (1.0, 2.0, 1.0)  # swimming, cycling, running
+
+class PlanColumns(NamedTuple):
+    """Columnar training plan: one entry per calendar day in each array"""
+    dates: List[date]
+    swimming_hours: array
+    cycling_hours: array
+    running_hours: array
+    total_hours: array
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+def _daily_hours(template: Optional[TemplateEntry], factor: float) -> Tuple[float, float, float, float]:
+    """Rounded (swimming, cycling, running, total) hours of one day"""
+    if not template:
+        swimming_hours, cycling_hours, running_hours = FALLBACK_DAILY_HOURS
+    else:
+        daily_total = template.total_hours_per_week / TRAINING_DAYS_PER_WEEK
+        swimming_hours = daily_total * template.swimming_percentage
+        cycling_hours = daily_total * template.cycling_percentage
+        running_hours = daily_total * template.running_percentage
+    if factor != 1.0:
+        swimming_hours *= factor
+        cycling_hours *= factor
+        running_hours *= factor
+    total_hours = swimming_hours + cycling_hours + running_hours
+    return round(swimming_hours, 2), round(cycling_hours, 2), round(running_hours, 2), round(total_hours, 2)
+
+def compute_training_plan(
+    start_date: date,
+    competition_date: date,
+    difficulty: int,
+    index: Optional[PeriodizationIndex] = None,
+) -> PlanColumns:
+    """Compute every day from start_date up to the competition without touching the database.
+
+    The template is picked once for the plan, so each day is either a regular
+    day or a lighter Sunday. Both variants are computed once and the columns are
+    filled by repeating the seven-day pattern over the whole range.
+    """
+    days = max(0, (competition_date - start_date).days)
+    weeks_out = calculate_weeks_until_competition(competition_date, start_date)
+    template = (index or get_periodization_index()).lookup(difficulty, weeks_out)
+    regular = _daily_hours(template, 1.0)
+    sunday = _daily_hours(template, SUNDAY_FACTOR)  # lighter on Sundays
+
+    first_weekday = start_date.weekday()
+    week = [sunday if (first_weekday + offset) % 7 == 6 else regular for offset in range(7)]
+    full_weeks, remainder = divmod(days, 7)
+    columns = []
+    for sport in range(4):
+        pattern = array("d", (day[sport] for day in week))
+        columns.append(pattern * full_weeks + pattern[:remainder])
 
-def generate_training_plan(user_id: int, competition_date: date, difficulty: int, db: Session) -> TrainingPlan:
+    start_ordinal = start_date.toordinal()
+    dates = [date.fromordinal(ordinal) for ordinal in range(start_ordinal, start_ordinal + days)]
+    return PlanColumns(dates, *columns)
+
+class PlanZones(NamedTuple):
+    """Time in zone of a run of days: per sport one array of hours per zone, and the daily load"""
+    hours: Dict[str, List[array]]
+    load: array
+
+def split_hours(value: float, fractions: Sequence[float]) -> Tuple[float, ...]:
+    """Split hours into zones rounded to hundredths that add up to value.
+
+    Uses largest-remainder rounding: every zone gets its share rounded down and
+    the leftover hundredths go to the zones with the largest remainders.
+    """
+    if not any(fractions):
+        return (0.0,) * len(fractions)
+    cents = round(value * 100)
+    exact = [cents * fraction for fraction in fractions]
+    parts = [math.floor(share) for share in exact]
+    by_remainder = sorted(range(len(exact)), key=lambda zone: exact[zone] - parts[zone], reverse=True)
+    for zone in by_remainder[:cents - sum(parts)]:
+        parts[zone] += 1
+    return tuple(part / 100 for part in parts)
+
+def prescribe_zones(
+    days: Sequence[tuple],
+    competition_date: date,
+    difficulty: int,
+    table: Optional[ZoneTable] = None,
+    index: Optional[PeriodizationIndex] = None,
+) -> PlanZones:
+    """Split the sport hours of (date, swimming, cycling, running, total) days into zones.
+
+    The split depends only on the sport and the periodization phase of the day,
+    the same phase GET /training-plan/{uin}/summary reports. Phases are
+    contiguous runs of days found by binary search on the template boundaries,
+    and a plan has only a few distinct hour values, so each run is converted
+    through a small table of split_hours results instead of computing every
+    day. The zones of a sport always add up to its hours.
+    """
+    table = table or get_zone_table()
+    index = index or get_periodization_index()
+    hours = {sport: [array("d") for _ in table.zones.get(sport, ())] for sport in SPORTS}
+    load = array("d")
+    ordinals = [day[0].toordinal() for day in days]
+    competition_ordinal = competition_date.toordinal()
+    # (first, end, split) of the runs of days sharing a zone split, earliest first
+    runs = []
+    start = 0
+    for phase in (*reversed(index.phases(difficulty)), None):
+        # Days at least phase whole weeks before the competition, the rest have no template
+        if phase is None or phase <= 1:
+            end = len(days)
+        else:
+            end = bisect_right(ordinals, competition_ordinal - 7 * phase, start)
+        if end > start:
+            split = zone_split(phase)
+            if runs and runs[-1][2] == split:
+                runs[-1] = (runs[-1][0], end, split)
+            else:
+                runs.append((start, end, split))
+            start = end
+    for first, end, split in runs:
+        run = days[first:end]
+        intensities = [table.intensity(sport, split) for sport in SPORTS]
+        for position, sport in enumerate(SPORTS, start=1):
+            sport_hours = [day[position] for day in run]
+            fractions = table.fractions(sport, split)
+            shares = {value: split_hours(value, fractions) for value in set(sport_hours)}
+            for zone, zone_hours in enumerate(hours[sport]):
+                rounded = {value: share[zone] for value, share in shares.items()}
+                zone_hours.fromlist(list(map(rounded.__getitem__, sport_hours)))
+        sport_hours = [day[1:4] for day in run]
+        rounded = {
+            value: round(sum(hours * intensity for hours, intensity in zip(value, intensities)), 2)
+            for value in set(sport_hours)
+        }
+        load.fromlist(list(map(rounded.__getitem__, sport_hours)))
+    return PlanZones(hours, load)
+
+class PlanSequenceCache:
+    """LRU cache of computed day sequences bounded by the total number of cached days.
+
+    A sequence depends only on the difficulty band, the number of days to the
+    competition and the weekday of the first day, so the cached hour columns are
+    rebased onto the concrete dates of each request.
+    """
+
+    def __init__(self, max_days: int):
+        self.max_days = max_days
+        self.hits = 0
+        self.misses = 0
+        self._days = 0
+        self._entries: "OrderedDict[tuple, Tuple[array, array, array, array]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[Tuple[array, array, array, array]]:
+        with self._lock:
+            hours = self._entries.get(key)
+            if hours is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return hours
+
+    def put(self, key: tuple, hours: Tuple[array, array, array, array]) -> None:
+        size = len(hours[0])
+        if size > self.max_days:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._days -= len(previous[0])
+            self._entries[key] = hours
+            self._days += size
+            while self._days > self.max_days:
+                _, evicted = self._entries.popitem(last=False)
+                self._days -= len(evicted[0])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._days = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "days": self._days,
+                "max_days": self.max_days,
+            }
+
+plan_cache = PlanSequenceCache(PLAN_CACHE_MAX_DAYS)
+
+class CachedResponse(NamedTuple):
+    etag: str
+    body: bytes
+    media_type: str = "application/json"
+
+class PlanResponseCache:
+    """Serialized plan responses per uin, evicted least recently used by total size.
+
+    Reads that started before a write to the same uin must not repopulate the
+    cache with stale bytes, so every invalidation bumps a generation counter
+    (striped by uin to keep memory bounded) that put() checks. The counters are
+    in shared memory and entries remember theirs, so a write handled by another
+    worker process also invalidates the entries cached here.
+    """
+
+    STRIPES = 4096
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[Tuple[str, tuple], CachedResponse]" = OrderedDict()
+        self._variants: Dict[str, set] = {}
+        self._generations = multiprocessing.RawArray("q", self.STRIPES)
+        self._generations_lock = multiprocessing.Lock()
+        self._entry_generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _stripe(self, uin: str) -> int:
+        # crc32 rather than hash(): str hashes are randomized per interpreter
+        return zlib.crc32(uin.encode()) % self.STRIPES
+
+    def generation(self, uin: str) -> int:
+        return self._generations[self._stripe(uin)]
+
+    def get(self, uin: str, variant: tuple) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get((uin, variant))
+            if entry is not None and self._entry_generations[uin] != self._generations[self._stripe(uin)]:
+                self._discard_uin(uin)  # invalidated by another worker
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((uin, variant))
+            self.hits += 1
+            return entry
+
+    def put(self, uin: str, variant: tuple, body: bytes, generation: int, media_type: str = "application/json") -> CachedResponse:
+        entry = CachedResponse('"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"', body, media_type)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if self._generations[self._stripe(uin)] != generation:
+                return entry  # the plan changed while this response was being built
+            if self._entry_generations.get(uin, generation) != generation:
+                self._discard_uin(uin)
+            self._discard((uin, variant))
+            self._entries[(uin, variant)] = entry
+            self._variants.setdefault(uin, set()).add(variant)
+            self._entry_generations[uin] = generation
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+        return entry
+
+    def invalidate(self, uin: str) -> None:
+        with self._lock:
+            with self._generations_lock:
+                self._generations[self._stripe(uin)] += 1
+            self._discard_uin(uin)
+
+    def _discard_uin(self, uin: str) -> None:
+        for variant in list(self._variants.get(uin, ())):
+            self._discard((uin, variant))
+
+    def _discard(self, key: Tuple[str, tuple]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry.body)
+        variants = self._variants[key[0]]
+        variants.discard(key[1])
+        if not variants:
+            del self._variants[key[0]]
+            del self._entry_generations[key[0]]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+response_cache = PlanResponseCache(RESPONSE_CACHE_MAX_BYTES)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+def cached_response(entry: CachedResponse, if_none_match: Optional[str]) -> Response:
+    # no-cache: clients may store the plan but must revalidate it, which costs a 304
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+# Plan representations of GET /training-plan/{uin}, negotiated with the Accept header.
+# The columnar ones hold one array per field instead of one object per day.
+PLAN_JSON = "application/json"
+PLAN_COLUMNS_JSON = "application/vnd.triathlon.plan-columns+json"
+PLAN_COLUMNS_MSGPACK = "application/x-msgpack"
+PLAN_PACKED = "application/vnd.triathlon.plan-packed"
+PLAN_MEDIA_TYPES = (PLAN_JSON, PLAN_COLUMNS_JSON, PLAN_PACKED) + ((PLAN_COLUMNS_MSGPACK,) if msgpack else ())
+
+# Packed layout, little-endian: this header, then with PACKED_OFFSETS one uint32
+# per day (days since first_date), then the centi-hour columns of pack_plan_hours
+PACKED_PLAN_HEADER = struct.Struct("<4sBBHqiiiI")  # magic, version, flags, difficulty, id, competition_date, first_date, next_cursor, days
+PACKED_PLAN_MAGIC = b"TPLN"
+PACKED_OFFSETS = 1  # days are not consecutive
+
+def encode_plan(
+    training_plan: "TrainingPlan",
+    days: List[tuple],
+    next_cursor: Optional[date],
+    media_type: str,
+    zones: Optional["PlanZones"] = None,
+) -> bytes:
+    """Body of a plan in one of the columnar representations"""
+    if media_type == PLAN_PACKED:
+        try:
+            return packed_plan_body(training_plan, days, next_cursor)
+        except OverflowError:
+            raise HTTPException(status_code=406, detail="Training hours are too large for the packed layout")
+    document = plan_columns_document(training_plan, days, next_cursor, zones)
+    if media_type == PLAN_COLUMNS_MSGPACK:
+        return msgpack.packb(document)
+    return json.dumps(document, separators=(",", ":")).encode()
+
+def negotiate_plan_media_type(accept: Optional[str]) -> Optional[str]:
+    """Preferred plan representation acceptable to the client, None when there is none"""
+    if not accept:
+        return PLAN_JSON
+    best, best_quality = None, 0.0
+    for item in accept.split(","):
+        media_range, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        media_range = media_range.lower()
+        if media_range in ("*/*", "application/*"):
+            candidate = PLAN_JSON
+        elif media_range in PLAN_MEDIA_TYPES:
+            candidate = media_range
+        else:
+            continue
+        # Explicitly named types win over wildcards of the same quality
+        if quality > best_quality or (quality == best_quality and quality > 0 and "*" not in media_range):
+            best, best_quality = candidate, quality
+    return best
+
+def plan_columns_document(
+    training_plan: "TrainingPlan",
+    days: List[tuple],
+    next_cursor: Optional[date],
+    zones: Optional["PlanZones"] = None,
+) -> dict:
+    """Columnar plan built straight from (date, swimming, cycling, running, total) tuples"""
+    dates, swimming, cycling, running, total = zip(*days) if days else ((), (), (), (), ())
+    document = {
+        "id": training_plan.id,
+        "competition_date": training_plan.competition_date.isoformat(),
+        "difficulty": training_plan.difficulty,
+        "dates": [day.isoformat() for day in dates],
+        "swimming_hours": list(swimming),
+        "cycling_hours": list(cycling),
+        "running_hours": list(running),
+        "total_hours": list(total),
+        "next_cursor": next_cursor.isoformat() if next_cursor else None,
+    }
+    if zones is not None:
+        document["zones"] = {sport: [list(column) for column in columns] for sport, columns in zones.hours.items()}
+        document["load"] = list(zones.load)
+    return document
+
+def packed_plan_body(training_plan: "TrainingPlan", days: Optional[List[tuple]], next_cursor: Optional[date]) -> bytes:
+    """Plan in the packed layout; days None sends a packed-storage plan's blob as it is stored"""
+    if days is None:
+        hours = training_plan.packed_days or b""
+        first_date, count, flags, offsets = training_plan.start_date, len(hours) // 8, 0, b""
+    else:
+        first_date = days[0][0] if days else training_plan.start_date or training_plan.competition_date
+        count = len(days)
+        first_ordinal = first_date.toordinal()
+        day_offsets = array("I", (day.toordinal() - first_ordinal for day, *_ in days))
+        flags = 0 if all(offset == position for position, offset in enumerate(day_offsets)) else PACKED_OFFSETS
+        if sys.byteorder == "big":
+            day_offsets.byteswap()
+        offsets = day_offsets.tobytes() if flags & PACKED_OFFSETS else b""
+        hours = pack_plan_hours(list(zip(*days))[1:] if days else ((), (), (), ()))
+    header = PACKED_PLAN_HEADER.pack(
+        PACKED_PLAN_MAGIC,
+        1,
+        flags,
+        training_plan.difficulty,
+        training_plan.id,
+        training_plan.competition_date.toordinal(),
+        first_date.toordinal(),
+        next_cursor.toordinal() if next_cursor else 0,
+        count,
+    )
+    return header + offsets + hours
+
+def get_training_plan_columns(start_date: date, competition_date: date, difficulty: int) -> PlanColumns:
+    """compute_training_plan memoized on (difficulty band, days to competition, start weekday)"""
+    index = get_periodization_index()
+    days = max(0, (competition_date - start_date).days)
+    key = (index.band(difficulty), days, start_date.weekday())
+    hours = plan_cache.get(key)
+    if hours is None:
+        columns = compute_training_plan(start_date, competition_date, difficulty, index)
+        if _periodization_index is index:  # templates did not change while computing
+            plan_cache.put(key, tuple(columns[1:]))
+        return columns
+    start_ordinal = start_date.toordinal()
+    dates = [date.fromordinal(ordinal) for ordinal in range(start_ordinal, start_ordinal + days)]
+    return PlanColumns(dates, *(column[:] for column in hours))
+
+def training_day_rows(training_plan_id: int, columns: PlanColumns) -> List[dict]:
+    """Plain insert parameters for the days of a computed plan"""
+    return [
+        {
+            "training_plan_id": training_plan_id,
+            "date": day,
+            "swimming_hours": swimming_hours,
+            "cycling_hours": cycling_hours,
+            "running_hours": running_hours,
+            "total_hours": total_hours,
+        }
+        for day, swimming_hours, cycling_hours, running_hours, total_hours in zip(*columns)
+    ]
+
+def pack_plan_hours(hour_columns: Sequence[Sequence[float]]) -> bytes:
+    """Encode swimming, cycling, running and total hours as little-endian int16 centi-hours"""
+    packed = array("h")
+    for column in hour_columns:
+        packed.extend(round(hours * 100) for hours in column)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+PACKED_OVERFLOW_DETAIL = "Training hours are too large for packed storage"
+
+def pack_plan_columns(columns: "PlanColumns") -> bytes:
+    """packed_days of a new plan, 400 when its hours do not fit in int16 centi-hours"""
+    try:
+        return pack_plan_hours(columns[1:])
+    except OverflowError:
+        raise HTTPException(status_code=400, detail=PACKED_OVERFLOW_DETAIL)
+
+def unpack_plan_hours(blob: Optional[bytes]) -> Tuple[Sequence[int], ...]:
+    """Centi-hour columns of a packed plan, zero-copy views of the blob on little-endian hosts"""
+    if sys.byteorder == "big":
+        values = array("h", blob or b"")
+        values.byteswap()
+        view = memoryview(values)
+    else:
+        view = memoryview(blob or b"").cast("h")
+    days = len(view) // 4
+    return tuple(view[column * days:(column + 1) * days] for column in range(4))
+
+def write_training_days(db: Session, day_rows: List[dict], bulk_insert: Optional[bool] = None) -> None:
+    """Add training days to the current transaction"""
+    if bulk_insert is None:
+        bulk_insert = BULK_INSERT_TRAINING_DAYS
+    if bulk_insert:
+        # One executemany in the same transaction instead of a flush per object
+        if day_rows:
+            db.execute(insert(TrainingDay), day_rows)
+    else:
+        db.add_all(TrainingDay(**row) for row in day_rows)
+
+def delete_plans(db: Session, *criteria) -> int:
+    """Delete the plans matching criteria with their days and week summaries.
+
+    Set-based: a constant number of statements however many plans and days
+    match, and no plan is loaded into the session. Returns the number of plans.
+    """
+    if not PLAN_DELETES_CASCADE:
+        plan_ids = select(TrainingPlan.id).where(*criteria)
+        for child in (TrainingDay, PlanWeekSummary):
+            db.execute(
+                delete(child).where(child.training_plan_id.in_(plan_ids)),
+                execution_options={"synchronize_session": False},
+            )
+    return db.execute(
+        delete(TrainingPlan).where(*criteria),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+
+def delete_user_plans(db: Session, user_ids: List[int]) -> int:
+    """Delete all plans of the given users"""
+    return delete_plans(db, TrainingPlan.user_id.in_(user_ids))
+
+def periodization_phase(
+    day: date, competition_date: date, difficulty: int, index: Optional[PeriodizationIndex] = None
+) -> Optional[int]:
+    """Periodization phase of a day: weeks_out of the template for the whole weeks left until the competition"""
+    weeks_out = calculate_weeks_until_competition(competition_date, day)
+    template = (index or get_periodization_index()).lookup(difficulty, weeks_out)
+    return template.weeks_out if template else None
+
+def week_summary_rows(
+    training_plan_id: int, days: Iterable[tuple], competition_date: date, difficulty: int
+) -> List[dict]:
+    """plan_week_summaries parameters aggregated from (date, swimming, cycling, running, total) days.
+
+    Each week is labelled with the periodization phase of its first day.
+    """
+    index = get_periodization_index()
+    weeks: Dict[date, dict] = {}
+    for day, swimming_hours, cycling_hours, running_hours, total_hours in days:
+        week_start = day - timedelta(days=day.weekday())
+        week = weeks.get(week_start)
+        if week is None:
+            week = weeks[week_start] = {
+                "training_plan_id": training_plan_id,
+                "week_start": week_start,
+                "weeks_out": periodization_phase(day, competition_date, difficulty, index),
+                "days": 0,
+                "swimming_hours": 0.0,
+                "cycling_hours": 0.0,
+                "running_hours": 0.0,
+                "total_hours": 0.0,
+            }
+        week["days"] += 1
+        week["swimming_hours"] += swimming_hours
+        week["cycling_hours"] += cycling_hours
+        week["running_hours"] += running_hours
+        week["total_hours"] += total_hours
+    return list(weeks.values())
+
+def sync_week_summaries(db: Session, training_plan_id: int, summary_rows: List[dict]) -> None:
+    """Rewrite only the weekly summaries of a plan that differ from summary_rows"""
+    fields = ("weeks_out", "days", "swimming_hours", "cycling_hours", "running_hours", "total_hours")
+    stored = {
+        row.week_start: row
+        for row in db.execute(
+            select(PlanWeekSummary.id, PlanWeekSummary.week_start, *(getattr(PlanWeekSummary, f) for f in fields))
+            .where(PlanWeekSummary.training_plan_id == training_plan_id)
+        )
+    }
+    inserts, updates = [], []
+    for summary in summary_rows:
+        row = stored.pop(summary["week_start"], None)
+        if row is None:
+            inserts.append(summary)
+        elif tuple(getattr(row, f) for f in fields) != tuple(summary[f] for f in fields):
+            updates.append({"id": row.id, **{f: summary[f] for f in fields}})
+    if stored:
+        db.execute(
+            delete(PlanWeekSummary).where(PlanWeekSummary.id.in_([row.id for row in stored.values()])),
+            execution_options={"synchronize_session": False},
+        )
+    if updates:
+        db.execute(update(PlanWeekSummary), updates)
+    if inserts:
+        db.execute(insert(PlanWeekSummary), inserts)
+
+def adjust_week_summary(db: Session, training_plan_id: int, day: date, old: tuple, new: tuple) -> None:
+    """Apply the change of one day's (swimming, cycling, running, total) hours to its week"""
+    week_start = day - timedelta(days=day.weekday())
+    db.execute(
+        update(PlanWeekSummary)
+        .where(PlanWeekSummary.training_plan_id == training_plan_id, PlanWeekSummary.week_start == week_start)
+        .values(
+            swimming_hours=PlanWeekSummary.swimming_hours + (new[0] - old[0]),
+            cycling_hours=PlanWeekSummary.cycling_hours + (new[1] - old[1]),
+            running_hours=PlanWeekSummary.running_hours + (new[2] - old[2]),
+            total_hours=PlanWeekSummary.total_hours + (new[3] - old[3]),
+        ),
+        execution_options={"synchronize_session": False},
+    )
+
+def generate_training_plan(
+    user_id: int,
+    competition_date: date,
+    difficulty: int,
+    db: Session,
+    bulk_insert: Optional[bool] = None,
+    columns: Optional[PlanColumns] = None,
+) -> TrainingPlan:
     """Generate a training plan based on Joe Friel's methodology"""
+    start_date = date.today()
+    
+    # Calculate training days from today until competition
+    if columns is None:
+        columns = get_training_plan_columns(start_date, competition_date, difficulty)
     
     # Create training plan
     training_plan = TrainingPlan(
         user_id=user_id,
         competition_date=competition_date,
-        difficulty=difficulty
+        difficulty=difficulty,
+        start_date=start_date,
+        template_version=get_periodization_index().version,
+        storage=PLAN_STORAGE,
+        packed_days=pack_plan_columns(columns) if PLAN_STORAGE == "packed" else None,
     )
     db.add(training_plan)
     db.flush()  # Get the ID
     
-    # Calculate training days from today until competition
-    start_date = date.today()
-    current_date = start_date
-    
-    while current_date < competition_date:
-        weeks_out = calculate_weeks_until_competition(competition_date)
-        template = get_periodization_template(difficulty, weeks_out, db)
-        
-        if not template:
-            # Fallback to basic template
-            swimming_hours = 1.0
-            cycling_hours = 2.0
-            running_hours = 1.0
-        else:
-            # Calculate daily hours based on template (assuming 6 training days per week)
-            daily_total = template.total_hours_per_week / 6
-            swimming_hours = daily_total * template.swimming_percentage
-            cycling_hours = daily_total * template.cycling_percentage
-            running_hours = daily_total * template.running_percentage
-        
-        # Adjust for day of week (lighter on Sundays)
-        if current_date.weekday() == 6:  # Sunday
-            swimming_hours *= 0.5
-            cycling_hours *= 0.5
-            running_hours *= 0.5
-        
-        total_hours = swimming_hours + cycling_hours + running_hours
-        
-        training_day = TrainingDay(
-            training_plan_id=training_plan.id,
-            date=current_date,
-            swimming_hours=round(swimming_hours, 2),
-            cycling_hours=round(cycling_hours, 2),
-            running_hours=round(running_hours, 2),
-            total_hours=round(total_hours, 2)
-        )
-        db.add(training_day)
-        
-        current_date += timedelta(days=1)
+    with span("write"):
+        # Lazy plans compute their days on read
+        if PLAN_STORAGE == "rows":
+            write_training_days(db, training_day_rows(training_plan.id, columns), bulk_insert)
+        summary_rows = week_summary_rows(training_plan.id, zip(*columns), competition_date, difficulty)
+        if summary_rows:
+            db.execute(insert(PlanWeekSummary), summary_rows)
     
     db.commit()
     return training_plan
 
-# API Endpoints
-@app.post("/training-plan", response_model=TrainingPlanResponse)
-async def create_training_plan(plan_data: TrainingPlanCreate, db: Session = Depends(get_db)):
-    """Create or update a training plan for a user"""
+def materialize_lazy_plans(index: PeriodizationIndex) -> int:
+    """Store the computed days of lazy plans built from index as rows.
+
+    Called before the templates behind index are replaced, after which those
+    plans could no longer be recomputed. Overridden days are kept as they are.
+    """
+    db = SessionLocal()
+    try:
+        plans = db.execute(
+            select(TrainingPlan.id, TrainingPlan.start_date, TrainingPlan.competition_date, TrainingPlan.difficulty)
+            .where(TrainingPlan.storage == "lazy", TrainingPlan.template_version == index.version)
+        ).all()
+        db.rollback()
+        materialized = 0
+        for plan_id, start_date, competition_date, difficulty in plans:
+            # Every worker runs this when templates change; claiming the plan with
+            # the first statement of its transaction lets only one of them write it
+            claimed = db.execute(
+                update(TrainingPlan)
+                .where(TrainingPlan.id == plan_id, TrainingPlan.storage == "lazy")
+                .values(storage="rows")
+            ).rowcount
+            if not claimed:
+                db.rollback()
+                continue
+            columns = compute_training_plan(start_date, competition_date, difficulty, index)
+            overridden = set(db.scalars(select(TrainingDay.date).where(TrainingDay.training_plan_id == plan_id)))
+            write_training_days(
+                db, [row for row in training_day_rows(plan_id, columns) if row["date"] not in overridden]
+            )
+            db.commit()
+            materialized += 1
+        return materialized
+    finally:
+        db.close()
+
+# Precomputed plan library
+class PlanLibrary:
+    """Hit/miss counters of plan lookups in the plan_library table.
+
+    An entry holds the days of a plan for one race and difficulty band from the
+    day it was built. Days depend only on the template picked for the plan and
+    the weekday, so a plan starting later is a suffix of the entry as long as it
+    picks the same template.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+plan_library = PlanLibrary()
+
+def plan_library_races_configured() -> bool:
+    return bool(PLAN_LIBRARY_RACES) or PLAN_LIBRARY_POPULAR_RACES > 0
+
+def plan_library_races(db: Session) -> List[date]:
+    """Upcoming configured races and most common competition dates of stored plans"""
+    today = date.today()
+    races = {race for race in PLAN_LIBRARY_RACES if race > today}
+    if PLAN_LIBRARY_POPULAR_RACES > 0:
+        races.update(db.scalars(
+            select(TrainingPlan.competition_date)
+            .where(TrainingPlan.competition_date > today)
+            .group_by(TrainingPlan.competition_date)
+            .order_by(func.count().desc(), TrainingPlan.competition_date)
+            .limit(PLAN_LIBRARY_POPULAR_RACES)
+        ))
+    return sorted(races)
+
+def plan_library_current(db: Session, index: PeriodizationIndex) -> bool:
+    """Whether the library was built today from the current templates"""
+    return db.scalar(
+        select(PlanLibraryEntry.id)
+        .where(PlanLibraryEntry.template_version == index.version, PlanLibraryEntry.start_date == date.today())
+        .limit(1)
+    ) is not None
+
+def precompute_plan_library(db: Optional[Session] = None) -> int:
+    """Replace the library with plans from today for every library race and difficulty band.
+
+    Meant to run nightly and whenever the periodization templates change.
+    Returns the number of entries written.
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        index = get_periodization_index()
+        start_date = date.today()
+        entries = []
+        with span("library"):
+            for race_date in plan_library_races(db):
+                for difficulty_min, difficulty_max in index.bands():
+                    columns = compute_training_plan(start_date, race_date, difficulty_min, index)
+                    entries.append({
+                        "race_date": race_date,
+                        "difficulty_min": difficulty_min,
+                        "difficulty_max": difficulty_max,
+                        "start_date": start_date,
+                        "template_version": index.version,
+                        "weeks_out": periodization_phase(start_date, race_date, difficulty_min, index),
+                        "packed_days": pack_plan_hours(columns[1:]),
+                    })
+            db.execute(delete(PlanLibraryEntry), execution_options={"synchronize_session": False})
+            if entries:
+                db.execute(insert(PlanLibraryEntry), entries)
+            db.commit()
+        return len(entries)
+    finally:
+        if own_session:
+            db.close()
+
+def library_plan_columns(db: Session, start_date: date, competition_date: date, difficulty: int) -> Optional[PlanColumns]:
+    """Days of a plan sliced from the library, None when no entry can provide them"""
+    index = get_periodization_index()
+    with span("library"):
+        entry = db.execute(
+            select(PlanLibraryEntry.start_date, PlanLibraryEntry.weeks_out, PlanLibraryEntry.packed_days)
+            .where(
+                PlanLibraryEntry.race_date == competition_date,
+                PlanLibraryEntry.difficulty_min <= difficulty,
+                PlanLibraryEntry.difficulty_max >= difficulty,
+                PlanLibraryEntry.template_version == index.version,
+            )
+            .limit(1)
+        ).first()
+        offset = (start_date - entry.start_date).days if entry is not None else -1
+        if offset < 0 or entry.weeks_out != periodization_phase(start_date, competition_date, difficulty, index):
+            plan_library.record(False)
+            return None
+        hour_columns = [array("d", (value / 100 for value in column[offset:])) for column in unpack_plan_hours(entry.packed_days)]
+    plan_library.record(True)
+    days = len(hour_columns[0])
+    start_ordinal = start_date.toordinal()
+    dates = [date.fromordinal(ordinal) for ordinal in range(start_ordinal, start_ordinal + days)]
+    return PlanColumns(dates, *hour_columns)
+
+def plan_columns_for(db: Session, start_date: date, competition_date: date, difficulty: int) -> PlanColumns:
+    """Days of a new plan, from the library when possible, otherwise computed"""
+    columns = None
+    if plan_library_races_configured():
+        # Without library races the table is empty; skip the lookup on every write
+        columns = library_plan_columns(db, start_date, competition_date, difficulty)
+    if columns is None:
+        columns = get_training_plan_columns(start_date, competition_date, difficulty)
+    return columns
+
+def delete_plan_days(db: Session, training_plan_id: int) -> int:
+    """Delete every stored day of a plan, returning how many there were"""
+    result = db.execute(
+        delete(TrainingDay).where(TrainingDay.training_plan_id == training_plan_id),
+        execution_options={"synchronize_session": False},
+    )
+    return result.rowcount
+
+def sync_training_days(db: Session, training_plan_id: int, columns: PlanColumns) -> int:
+    """Bring the stored days of a plan in line with columns, writing only the rows that differ.
+
+    Returns the number of inserted, updated and deleted days.
+    """
+    stored = {}
+    stale_ids = []
+    for row in db.execute(
+        select(
+            TrainingDay.id,
+            TrainingDay.date,
+            TrainingDay.swimming_hours,
+            TrainingDay.cycling_hours,
+            TrainingDay.running_hours,
+            TrainingDay.total_hours,
+        ).where(TrainingDay.training_plan_id == training_plan_id)
+    ):
+        if row.date in stored:
+            stale_ids.append(row.id)
+        else:
+            stored[row.date] = row
+    
+    inserts, updates = [], []
+    for day, swimming_hours, cycling_hours, running_hours, total_hours in zip(*columns):
+        row = stored.pop(day, None)
+        hours = {
+            "swimming_hours": swimming_hours,
+            "cycling_hours": cycling_hours,
+            "running_hours": running_hours,
+            "total_hours": total_hours,
+        }
+        if row is None:
+            inserts.append({"training_plan_id": training_plan_id, "date": day, **hours})
+        elif (row.swimming_hours, row.cycling_hours, row.running_hours, row.total_hours) != tuple(hours.values()):
+            updates.append({"id": row.id, **hours})
+    # Days that are no longer part of the plan, e.g. already past or after a moved race
+    stale_ids.extend(row.id for row in stored.values())
     
+    if stale_ids:
+        db.execute(
+            delete(TrainingDay).where(TrainingDay.id.in_(stale_ids)),
+            execution_options={"synchronize_session": False},
+        )
+    if updates:
+        db.execute(update(TrainingDay), updates)
+    write_training_days(db, inserts)
+    return len(inserts) + len(updates) + len(stale_ids)
+
+def plan_response(training_plan: TrainingPlan, columns: PlanColumns) -> TrainingPlanResponse:
+    """Response for a plan whose stored days match columns"""
+    return TrainingPlanResponse(
+        id=training_plan.id,
+        competition_date=training_plan.competition_date,
+        difficulty=training_plan.difficulty,
+        training_days=[
+            TrainingDayResponse(
+                date=day,
+                swimming_hours=swimming_hours,
+                cycling_hours=cycling_hours,
+                running_hours=running_hours,
+                total_hours=total_hours
+            )
+            for day, swimming_hours, cycling_hours, running_hours, total_hours in zip(*columns)
+        ]
+    )
+
+def validate_plan_request(plan_data: TrainingPlanCreate) -> Optional[str]:
+    """Error message for an invalid plan request, None when it is valid"""
     # Validate difficulty range
     if not (0 <= plan_data.difficulty <= 1000):
-        raise HTTPException(status_code=400, detail="Difficulty must be between 0 and 1000")
+        return "Difficulty must be between 0 and 1000"
     
     # Validate competition date
     if plan_data.competition_date <= date.today():
-        raise HTTPException(status_code=400, detail="Competition date must be in the future")
+        return "Competition date must be in the future"
     
-    # Get or create user
-    user = db.query(User).filter(User.uin == plan_data.uin).first()
-    if not user:
-        user = User(uin=plan_data.uin)
-        db.add(user)
-        db.flush()
+    return None
+
+def save_training_plan(db: Session, plan_data: TrainingPlanCreate) -> Tuple[TrainingPlan, PlanColumns]:
+    """Create or update the plan of plan_data.uin and commit it, returning the plan and its days"""
     
-    # Delete existing training plans for this user
-    existing_plans = db.query(TrainingPlan).filter(TrainingPlan.user_id == user.id).all()
-    for plan in existing_plans:
-        db.query(TrainingDay).filter(TrainingDay.training_plan_id == plan.id).delete()
-        db.delete(plan)
-    db.commit()
+    # Get or create user. The user row is locked (where the database supports it)
+    # so concurrent writers of the same plan in other processes take turns
+    with span("user"):
+        user = db.query(User).filter(User.uin == plan_data.uin).with_for_update().first()
+        if not user:
+            user = User(uin=plan_data.uin)
+            db.add(user)
+            try:
+                db.flush()
+            except IntegrityError:
+                # Created by a concurrent request in the meantime; nothing else was written yet
+                db.rollback()
+                user = db.query(User).filter(User.uin == plan_data.uin).with_for_update().one()
     
-    # Generate new training plan
-    training_plan = generate_training_plan(
-        user.id, 
-        plan_data.competition_date, 
-        plan_data.difficulty, 
-        db
+    start_date = date.today()
+    with span("compute"):
+        columns = plan_columns_for(db, start_date, plan_data.competition_date, plan_data.difficulty)
+    
+    training_plan = db.query(TrainingPlan).filter(TrainingPlan.user_id == user.id).order_by(TrainingPlan.id).first()
+    if training_plan is None:
+        with span("generate"):
+            training_plan = generate_training_plan(
+                user.id,
+                plan_data.competition_date,
+                plan_data.difficulty,
+                db,
+                columns=columns,
+            )
+        response_cache.invalidate(plan_data.uin)
+        return training_plan, columns
+    
+    # Update the existing plan in place and write only the days that changed
+    with span("delete"):
+        extra_plans = delete_plans(db, TrainingPlan.user_id == user.id, TrainingPlan.id != training_plan.id)
+    with span("sync"):
+        if PLAN_STORAGE == "rows" and (training_plan.storage or "rows") == "rows":
+            changed_days = sync_training_days(db, training_plan.id, columns)
+        else:
+            # A new plan discards overridden days of a lazy plan and rows left from another storage
+            changed_days = delete_plan_days(db, training_plan.id)
+            if PLAN_STORAGE == "rows":
+                changed_days += sync_training_days(db, training_plan.id, columns)
+        training_plan.packed_days = pack_plan_columns(columns) if PLAN_STORAGE == "packed" else None
+        sync_week_summaries(db, training_plan.id, week_summary_rows(
+            training_plan.id, zip(*columns), plan_data.competition_date, plan_data.difficulty
+        ))
+    training_plan.competition_date = plan_data.competition_date
+    training_plan.difficulty = plan_data.difficulty
+    training_plan.start_date = columns.dates[0]
+    training_plan.template_version = get_periodization_index().version
+    training_plan.storage = PLAN_STORAGE
+    
+    if extra_plans or changed_days or db.is_modified(training_plan):
+        db.commit()
+        response_cache.invalidate(plan_data.uin)
+    else:
+        # Identical re-submit: nothing to write
+        db.rollback()
+    return training_plan, columns
+
+# API Endpoints
+# Endpoints that use the database are plain functions: FastAPI runs them in its
+# threadpool, so blocking SQLAlchemy calls never stall the event loop.
+@app.post(
+    "/training-plan",
+    response_model=TrainingPlanResponse,
+    responses={202: {"model": PlanJobResponse, "description": "Plan generation queued"}},
+)
+def create_training_plan(
+    plan_data: TrainingPlanCreate,
+    background: bool = Query(False, description="Queue the generation and return 202 with a job"),
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Create or update a training plan for a user
+
+    With background=true the plan is generated by the job pool instead of
+    within the request, which answers 202 with the job to poll at GET /jobs/{id}.
+
+    A request repeated with the same Idempotency-Key within IDEMPOTENCY_TTL_SECONDS
+    gets the stored response instead of being handled again. Identical requests
+    arriving while one is being handled wait for it and share its response.
+    """
+    
+    error = validate_plan_request(plan_data)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    
+    fingerprint = plan_request_fingerprint(plan_data, background)
+    if idempotency_key:
+        # The fingerprint is part of the key so that reusing the key with another
+        # body is never coalesced onto the first request but rejected with 422
+        request_key = ("idempotency-key", idempotency_key, fingerprint)
+        try:
+            stored = stored_plan_request(db, idempotency_key, fingerprint)
+        except HTTPException as exc:
+            if exc.status_code != 409:
+                raise
+            # The request in progress may be handled by this process: share its outcome
+            outcome = plan_requests.join(request_key)
+            if outcome is not None:
+                return outcome.response()
+            stored = stored_plan_request(db, idempotency_key, fingerprint)
+        if stored is not None:
+            plan_requests.record_replay()
+            return stored.response(replayed=True)
+    else:
+        request_key = ("request", fingerprint)
+    
+    outcome = plan_requests.run(
+        request_key,
+        plan_data.uin,
+        lambda: handle_plan_request(db, plan_data, background, idempotency_key, fingerprint),
+    )
+    return outcome.response()
+
+class PlanRequestOutcome(NamedTuple):
+    """Response of a handled POST /training-plan, shareable between requests"""
+    status_code: int
+    body: bytes
+    media_type: str = "application/json"
+    location: Optional[str] = None
+
+    def response(self, replayed: bool = False) -> Response:
+        headers = {}
+        if self.location:
+            headers["Location"] = self.location
+        if replayed:
+            headers["Idempotent-Replayed"] = "true"
+        return Response(content=self.body, status_code=self.status_code, media_type=self.media_type, headers=headers)
+
+def plan_request_fingerprint(plan_data: TrainingPlanCreate, background: bool) -> str:
+    request = {**plan_data.model_dump(mode="json"), "background": background}
+    return hashlib.blake2b(json.dumps(request, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+def handle_plan_request(
+    db: Session,
+    plan_data: TrainingPlanCreate,
+    background: bool,
+    idempotency_key: Optional[str],
+    fingerprint: str,
+) -> PlanRequestOutcome:
+    if idempotency_key:
+        claimed = claim_idempotency_key(db, idempotency_key, fingerprint)
+        if isinstance(claimed, PlanRequestOutcome):
+            return claimed  # completed by another process just now
+    try:
+        if background:
+            job = enqueue_plan_job(db, plan_data)
+            outcome = PlanRequestOutcome(
+                202, plan_job_response(job).model_dump_json().encode(), location=f"/jobs/{job.id}"
+            )
+        else:
+            training_plan, columns = save_training_plan(db, plan_data)
+            with span("serialize"):
+                outcome = PlanRequestOutcome(200, plan_response(training_plan, columns).model_dump_json().encode())
+    except BaseException:
+        if idempotency_key:
+            release_idempotency_key(db, idempotency_key)
+        raise
+    if idempotency_key:
+        db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == idempotency_key)
+            .values(
+                status_code=outcome.status_code,
+                body=outcome.body,
+                media_type=outcome.media_type,
+                location=outcome.location,
+            ),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+    return outcome
+
+# Idempotency keys
+def stored_plan_request(db: Session, key: str, fingerprint: str) -> Optional[PlanRequestOutcome]:
+    """Stored outcome of a request with this key, None when the key is unused or expired.
+
+    Raises 422 when the key was used with a different request and 409 while
+    the first request with it is still being handled in another process.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    row = db.execute(
+        select(
+            IdempotencyKey.fingerprint,
+            IdempotencyKey.status_code,
+            IdempotencyKey.body,
+            IdempotencyKey.media_type,
+            IdempotencyKey.location,
+            IdempotencyKey.created_at,
+        ).where(IdempotencyKey.key == key, IdempotencyKey.created_at >= cutoff)
+    ).first()
+    db.rollback()  # end the read so the session starts the write with a fresh snapshot
+    if row is None:
+        return None
+    if row.fingerprint != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    if row.status_code is None:
+        if row.created_at < datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS):
+            return None  # abandoned, claim_idempotency_key takes it over
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is in progress",
+            headers={"Retry-After": "1"},
+        )
+    return PlanRequestOutcome(row.status_code, row.body, row.media_type, row.location)
+
+def claim_idempotency_key(db: Session, key: str, fingerprint: str) -> Optional[PlanRequestOutcome]:
+    """Mark key as in progress and commit, dropping expired and abandoned keys.
+
+    Returns the outcome when another process completed the key in the meantime.
+    """
+    now = datetime.utcnow()
+    db.execute(
+        delete(IdempotencyKey).where(
+            (IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS))
+            | (
+                (IdempotencyKey.key == key)
+                & IdempotencyKey.status_code.is_(None)
+                & (IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS))
+            )
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    db.add(IdempotencyKey(key=key, fingerprint=fingerprint, created_at=now))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        stored = stored_plan_request(db, key, fingerprint)
+        if stored is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+        return stored
+    return None
+
+def release_idempotency_key(db: Session, key: str) -> None:
+    """Forget a key whose request failed, so that a retry is handled again"""
+    db.rollback()
+    db.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+
+class _PendingRequest:
+    __slots__ = ("done", "outcome", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.outcome = None
+        self.error: Optional[BaseException] = None
+
+class InFlightPlanRequests:
+    """Coalesces concurrent identical plan requests of this process onto one execution.
+
+    The first request with a key runs; requests with the same key arriving
+    meanwhile wait and share its outcome. Writes of the same uin are serialized
+    by a striped lock so that their delete, sync and commit steps never interleave.
+    """
+
+    STRIPES = 256
+
+    def __init__(self):
+        self.coalesced = 0
+        self.replayed = 0
+        self._pending: Dict[tuple, _PendingRequest] = {}
+        self._uin_locks = [threading.Lock() for _ in range(self.STRIPES)]
+        self._lock = threading.Lock()
+
+    def uin_lock(self, uin: str) -> threading.Lock:
+        return self._uin_locks[zlib.crc32(uin.encode()) % self.STRIPES]
+
+    def join(self, key: tuple):
+        """Outcome of the request with key being handled by this process, None when there is none"""
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                return None
+            self.coalesced += 1
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.outcome
+
+    def run(self, key: tuple, uin: str, handle):
+        with self._lock:
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _PendingRequest()
+            else:
+                self.coalesced += 1
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.outcome
+        try:
+            with self.uin_lock(uin):
+                pending.outcome = handle()
+        except BaseException as exc:
+            pending.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+        return pending.outcome
+
+    def record_replay(self) -> None:
+        with self._lock:
+            self.replayed += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._pending), "coalesced": self.coalesced, "replayed": self.replayed}
+
+plan_requests = InFlightPlanRequests()
+
+# Background plan jobs
+def enqueue_plan_job(db: Session, plan_data: TrainingPlanCreate) -> PlanJob:
+    """Queue plan generation for plan_data.uin and commit.
+
+    A job of the same uin that is still queued takes the new parameters instead
+    of queueing another one, so repeated submissions are generated once with the
+    latest of them.
+    """
+    with span("enqueue"):
+        values = {"competition_date": plan_data.competition_date, "difficulty": plan_data.difficulty}
+        queued_id = db.scalar(
+            select(PlanJob.id)
+            .where(PlanJob.uin == plan_data.uin, PlanJob.status == "queued")
+            .order_by(PlanJob.created_at)
+            .limit(1)
+        )
+        # Conditional on the status so a job claimed meanwhile is not changed under its worker
+        if queued_id is None or not db.execute(
+            update(PlanJob)
+            .where(PlanJob.id == queued_id, PlanJob.status == "queued")
+            .values(submissions=PlanJob.submissions + 1, **values)
+        ).rowcount:
+            queued_id = uuid.uuid4().hex
+            db.add(PlanJob(id=queued_id, uin=plan_data.uin, status="queued", submissions=1, **values))
+        db.commit()
+    plan_jobs.notify()
+    return db.get(PlanJob, queued_id)
+
+def claim_plan_jobs(db: Session, limit: int) -> List[str]:
+    """Mark up to limit of the oldest queued jobs as running for this thread and return their ids.
+
+    Jobs of a uin whose plan is being generated elsewhere wait for it. Jobs left
+    running longer than PLAN_JOB_TIMEOUT_SECONDS (their process died) are retried.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=PLAN_JOB_TIMEOUT_SECONDS)
+    running_uins = select(PlanJob.uin).where(PlanJob.status == "running", PlanJob.started_at >= stale)
+    claimable = (PlanJob.status == "queued") | ((PlanJob.status == "running") & (PlanJob.started_at < stale))
+    candidates = db.scalars(
+        select(PlanJob.id)
+        .where(claimable, PlanJob.uin.not_in(running_uins))
+        .order_by(PlanJob.created_at)
+        .limit(limit)
+    ).all()
+    if not candidates:
+        db.rollback()
+        return []
+    claim = uuid.uuid4().hex
+    db.execute(
+        update(PlanJob)
+        .where(PlanJob.id.in_(candidates), claimable)
+        .values(status="running", claim=claim, started_at=now),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    return db.scalars(select(PlanJob.id).where(PlanJob.claim == claim).order_by(PlanJob.created_at)).all()
+
+def finish_plan_job(db: Session, job_id: str, **values) -> None:
+    db.execute(
+        update(PlanJob).where(PlanJob.id == job_id).values(finished_at=datetime.utcnow(), **values),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+
+def run_plan_job(db: Session, job_id: str) -> bool:
+    """Generate the plan of a claimed job and record the outcome, returning whether it succeeded"""
+    job = db.get(PlanJob, job_id)
+    plan_data = TrainingPlanCreate(uin=job.uin, competition_date=job.competition_date, difficulty=job.difficulty)
+    # The competition may have become past while the job was queued
+    error = validate_plan_request(plan_data)
+    if error is None:
+        try:
+            with span("job"), plan_requests.uin_lock(plan_data.uin):
+                training_plan, columns = save_training_plan(db, plan_data)
+        except Exception as exc:
+            db.rollback()
+            error = f"{type(exc).__name__}: {exc}"
+    if error is not None:
+        finish_plan_job(db, job_id, status="failed", detail=error)
+        return False
+    finish_plan_job(db, job_id, status="done", plan_id=training_plan.id, training_days=len(columns))
+    return True
+
+class PlanJobQueue:
+    """Pool of threads generating the plans of jobs stored in plan_jobs.
+
+    The table is the queue: jobs survive restarts and every process runs its own
+    pool, claiming jobs with a conditional UPDATE so each is generated once.
+    Threads are woken by jobs enqueued in this process and otherwise poll.
+    """
+
+    def __init__(self, workers: int, batch_size: int, poll_seconds: float):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.completed = 0
+        self.failed = 0
+        self._threads: List[threading.Thread] = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"plan-job-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            db = SessionLocal()
+            try:
+                job_ids = claim_plan_jobs(db, self.batch_size)
+                for job_id in job_ids:
+                    succeeded = run_plan_job(db, job_id)
+                    with self._lock:
+                        if succeeded:
+                            self.completed += 1
+                        else:
+                            self.failed += 1
+            except (OperationalError, IntegrityError):
+                # Lost a race for the database; claimed jobs are retried after the timeout
+                db.rollback()
+                job_ids = []
+            finally:
+                db.close()
+            if not job_ids:
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": len(self._threads),
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+plan_jobs = PlanJobQueue(PLAN_JOB_WORKERS, PLAN_JOB_BATCH_SIZE, PLAN_JOB_POLL_SECONDS)
+
+def plan_job_response(job: PlanJob) -> PlanJobResponse:
+    return PlanJobResponse(
+        id=job.id,
+        uin=job.uin,
+        status=job.status,
+        competition_date=job.competition_date,
+        difficulty=job.difficulty,
+        submissions=job.submissions,
+        plan_id=job.plan_id,
+        training_days=job.training_days,
+        detail=job.detail,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+@app.get("/jobs/{job_id}", response_model=PlanJobResponse)
+def get_plan_job(job_id: str, db: Session = Depends(get_db)):
+    """Status of a background plan job; plan_id is set once it is done"""
+    job = db.get(PlanJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return plan_job_response(job)
+
+class DayWindow(NamedTuple):
+    """Date range and page of training days requested by a client"""
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    after: Optional[date] = None
+    limit: Optional[int] = None
+
+def training_days_query(training_plan_id: int, window: DayWindow = DayWindow()):
+    """Training day columns of a plan in date order, restricted to the window.
+
+    With a limit one extra row is selected so callers can tell whether another page exists.
+    """
+    query = select(
+        TrainingDay.date,
+        TrainingDay.swimming_hours,
+        TrainingDay.cycling_hours,
+        TrainingDay.running_hours,
+        TrainingDay.total_hours,
+    ).where(TrainingDay.training_plan_id == training_plan_id)
+    if window.date_from is not None:
+        query = query.where(TrainingDay.date >= window.date_from)
+    if window.date_to is not None:
+        query = query.where(TrainingDay.date <= window.date_to)
+    if window.after is not None:
+        query = query.where(TrainingDay.date > window.after)
+    query = query.order_by(TrainingDay.date)
+    if window.limit is not None:
+        query = query.limit(window.limit + 1)
+    return query
+
+def window_positions(start_date: date, days: int, window: DayWindow) -> range:
+    """Positions within a run of consecutive days from start_date that fall into the window"""
+    first = 0
+    if window.date_from is not None:
+        first = max(first, (window.date_from - start_date).days)
+    if window.after is not None:
+        first = max(first, (window.after - start_date).days + 1)
+    last = days if window.date_to is None else min(days, (window.date_to - start_date).days + 1)
+    if window.limit is not None:
+        last = min(last, first + window.limit + 1)
+    return range(first, max(first, last))
+
+def require_current_lazy_plan(training_plan: TrainingPlan) -> None:
+    """Refuse a lazy plan whose templates were replaced without storing its days"""
+    if training_plan.storage == "lazy" and training_plan.template_version != get_periodization_index().version:
+        raise HTTPException(
+            status_code=409,
+            detail="Plan was computed with periodization templates that are no longer available; create it again",
+        )
+
+def lazy_plan_days(db: Session, training_plan: TrainingPlan, window: DayWindow) -> Iterator[tuple]:
+    """Days of a lazy plan computed from its parameters, with overridden days applied"""
+    require_current_lazy_plan(training_plan)
+    return _lazy_plan_days(db, training_plan, window)
+
+def _lazy_plan_days(db: Session, training_plan: TrainingPlan, window: DayWindow) -> Iterator[tuple]:
+    columns = get_training_plan_columns(
+        training_plan.start_date, training_plan.competition_date, training_plan.difficulty
     )
+    overrides = {
+        row[0]: tuple(row)
+        for row in db.execute(training_days_query(training_plan.id, window._replace(limit=None)))
+    }
+    for position in window_positions(training_plan.start_date, len(columns), window):
+        day = columns.dates[position]
+        override = overrides.get(day)
+        if override is not None:
+            yield override
+        else:
+            yield (
+                day,
+                columns.swimming_hours[position],
+                columns.cycling_hours[position],
+                columns.running_hours[position],
+                columns.total_hours[position],
+            )
+
+def packed_plan_days(training_plan: TrainingPlan, window: DayWindow) -> Iterator[tuple]:
+    """Days of a packed plan decoded straight from the blob loaded with the plan row"""
+    swimming, cycling, running, total = unpack_plan_hours(training_plan.packed_days)
+    start_ordinal = training_plan.start_date.toordinal()
+    for position in window_positions(training_plan.start_date, len(total), window):
+        yield (
+            date.fromordinal(start_ordinal + position),
+            swimming[position] / 100,
+            cycling[position] / 100,
+            running[position] / 100,
+            total[position] / 100,
+        )
+
+def plan_days(db: Session, training_plan: TrainingPlan, window: DayWindow = DayWindow()) -> Iterator[tuple]:
+    """(date, swimming, cycling, running, total) of a plan in date order within the window.
+
+    With a limit at most limit + 1 days are produced so callers can tell whether another page exists.
+    """
+    if training_plan.storage == "lazy":
+        return lazy_plan_days(db, training_plan, window)
+    if training_plan.storage == "packed":
+        return packed_plan_days(training_plan, window)
+    query = training_days_query(training_plan.id, window).execution_options(yield_per=STREAM_CHUNK_DAYS)
+    return (tuple(row) for row in db.execute(query))
+
+def stream_training_plan_json(
+    training_plan_id: int,
+    competition_date: date,
+    difficulty: int,
+    window: DayWindow = DayWindow(),
+) -> Iterator[bytes]:
+    """Write a TrainingPlanResponse JSON document chunk by chunk from a server-side cursor"""
+    yield (
+        f'{{"id":{training_plan_id},"competition_date":"{competition_date.isoformat()}",'
+        f'"difficulty":{difficulty},"training_days":['
+    ).encode()
+    # The request session is closed once the endpoint returns, so the stream owns its own
+    db = SessionLocal()
+    next_cursor = None
+    try:
+        training_plan = db.get(TrainingPlan, training_plan_id)
+        days = plan_days(db, training_plan, window) if training_plan is not None else iter(())
+        emitted = 0
+        last_date = None
+        separator = ""
+        for rows in iter(lambda: list(islice(days, STREAM_CHUNK_DAYS)), []):
+            if window.limit is not None and emitted + len(rows) > window.limit:
+                rows = rows[:window.limit - emitted]
+                next_cursor = rows[-1][0] if rows else last_date
+            if rows:
+                chunk = ",".join(
+                    f'{{"date":"{day.isoformat()}","swimming_hours":{json.dumps(swimming_hours)},'
+                    f'"cycling_hours":{json.dumps(cycling_hours)},"running_hours":{json.dumps(running_hours)},'
+                    f'"total_hours":{json.dumps(total_hours)}}}'
+                    for day, swimming_hours, cycling_hours, running_hours, total_hours in rows
+                )
+                yield (separator + chunk).encode()
+                separator = ","
+                emitted += len(rows)
+                last_date = rows[-1][0]
+            if next_cursor is not None:
+                break
+    finally:
+        db.close()
+    yield f'],"next_cursor":{json.dumps(next_cursor.isoformat() if next_cursor else None)}}}'.encode()
+
+@app.post("/training-plans/batch", response_model=BatchTrainingPlanResponse)
+def create_training_plans_batch(batch: BatchTrainingPlanCreate, db: Session = Depends(get_db)):
+    """Create or update training plans for many users in one transaction
+
+    Invalid entries are reported individually and do not prevent the others
+    from being created. Each uin may appear only once per batch.
+    """
+    if len(batch.plans) > MAX_BATCH_PLANS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {MAX_BATCH_PLANS} plans")
     
-    # Fetch the plan with training days for response
-    plan_with_days = db.query(TrainingPlan).filter(TrainingPlan.id == training_plan.id).first()
+    results: List[Optional[BatchPlanResult]] = [None] * len(batch.plans)
+    accepted: Dict[str, int] = {}
+    for position, entry in enumerate(batch.plans):
+        error = validate_plan_request(entry)
+        if error is None and entry.uin in accepted:
+            error = "Duplicate uin in batch"
+        if error:
+            results[position] = BatchPlanResult(uin=entry.uin, status="error", detail=error)
+        else:
+            accepted[entry.uin] = position
     
-    return TrainingPlanResponse(
-        id=plan_with_days.id,
-        competition_date=plan_with_days.competition_date,
-        difficulty=plan_with_days.difficulty,
-        training_days=[
-            TrainingDayResponse(
-                date=day.date,
-                swimming_hours=day.swimming_hours,
-                cycling_hours=day.cycling_hours,
-                running_hours=day.running_hours,
-                total_hours=day.total_hours
+    start_date = date.today()
+    with span("compute"):
+        plan_columns = {
+            uin: get_training_plan_columns(
+                start_date, batch.plans[position].competition_date, batch.plans[position].difficulty
             )
-            for day in sorted(plan_with_days.training_days, key=lambda x: x.date)
-        ]
+            for uin, position in accepted.items()
+        }
+    packed_days = {}
+    if PLAN_STORAGE == "packed":
+        for uin, position in list(accepted.items()):
+            try:
+                packed_days[uin] = pack_plan_hours(plan_columns[uin][1:])
+            except OverflowError:
+                del accepted[uin]
+                results[position] = BatchPlanResult(uin=uin, status="error", detail=PACKED_OVERFLOW_DETAIL)
+    
+    if accepted:
+        # Resolve all users with one IN query and create the missing ones together
+        users = {user.uin: user for user in db.query(User).filter(User.uin.in_(list(accepted)))}
+        new_users = [User(uin=uin) for uin in accepted if uin not in users]
+        db.add_all(new_users)
+        db.flush()
+        users.update((user.uin, user) for user in new_users)
+        
+        with span("delete"):
+            delete_user_plans(db, [user.id for user in users.values()])
+        
+        template_version = get_periodization_index().version
+        plans = {
+            uin: TrainingPlan(
+                user_id=users[uin].id,
+                competition_date=batch.plans[position].competition_date,
+                difficulty=batch.plans[position].difficulty,
+                start_date=start_date,
+                template_version=template_version,
+                storage=PLAN_STORAGE,
+                packed_days=packed_days.get(uin),
+            )
+            for uin, position in accepted.items()
+        }
+        db.add_all(plans.values())
+        db.flush()
+        
+        day_rows = []
+        summary_rows = []
+        for uin, position in accepted.items():
+            plan = plans[uin]
+            columns = plan_columns[uin]
+            if PLAN_STORAGE == "rows":
+                day_rows.extend(training_day_rows(plan.id, columns))
+            summary_rows.extend(week_summary_rows(plan.id, zip(*columns), plan.competition_date, plan.difficulty))
+            results[position] = BatchPlanResult(
+                uin=uin, status="created", plan_id=plan.id, training_days=len(columns)
+            )
+        with span("write"):
+            write_training_days(db, day_rows)
+            if summary_rows:
+                db.execute(insert(PlanWeekSummary), summary_rows)
+        db.commit()
+        for uin in accepted:
+            response_cache.invalidate(uin)
+    
+    return BatchTrainingPlanResponse(
+        created=len(accepted),
+        failed=len(batch.plans) - len(accepted),
+        results=results,
     )
 
 @app.get("/training-plan/{uin}", response_model=TrainingPlanResponse)
-async def get_training_plan(uin: str, db: Session = Depends(get_db)):
-    """Get current training plan for a user"""
+def get_training_plan(
+    uin: str,
+    date_from: Optional[date] = Query(None, alias="from", description="First date to return"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last date to return"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of days to return"),
+    cursor: Optional[date] = Query(None, description="next_cursor of the previous page"),
+    stream: bool = False,
+    expand: Optional[str] = Query(None, description="zones: add the time in each training zone to every day"),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Get current training plan for a user
+
+    from/to restrict the dates, limit and cursor page through them. With
+    stream=true the days are written incrementally while they are read, so
+    memory use does not grow with the length of the plan.
+
+    The Accept header selects the representation: JSON with one object per day,
+    or the columnar JSON, MessagePack and packed binary layouts, which are
+    encoded from the day tuples without building a model per day.
+
+    expand=zones adds each day's hours per sport and training zone and its
+    intensity-weighted load (not available when streaming or packed).
+
+    Other responses are cached per uin until the plan is written again and carry
+    a strong ETag; a matching If-None-Match gets 304 without a database read.
+    """
+    window = DayWindow(date_from, date_to, cursor, limit)
+    media_type = PLAN_JSON if stream else negotiate_plan_media_type(accept)
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=f"Plans are available as {', '.join(PLAN_MEDIA_TYPES)}")
+    if expand not in (None, "zones"):
+        raise HTTPException(status_code=400, detail="expand must be zones")
+    if expand and (stream or media_type == PLAN_PACKED):
+        raise HTTPException(status_code=400, detail="Zones are not available in streamed or packed responses")
+    if not stream:
+        # Zones also depend on the zone table and the templates, which change without the plan
+        zone_source = (_zone_generation.value, get_periodization_index().version) if expand else None
+        variant = (window, media_type, expand, zone_source)
+        cached = response_cache.get(uin, variant)
+        if cached is not None:
+            return cached_response(cached, if_none_match)
+        generation = response_cache.generation(uin)
     
     user = db.query(User).filter(User.uin == uin).first()
     if not user:
@@ -339,25 +2718,381 @@ async def get_training_plan(uin: str, db: Session = Depends(get_db)):
     training_plan = db.query(TrainingPlan).filter(TrainingPlan.user_id == user.id).first()
     if not training_plan:
         raise HTTPException(status_code=404, detail="No training plan found for this user")
+    require_current_lazy_plan(training_plan)
     
-    return TrainingPlanResponse(
+    if stream:
+        return StreamingResponse(
+            stream_training_plan_json(
+                training_plan.id, training_plan.competition_date, training_plan.difficulty, window
+            ),
+            media_type="application/json",
+        )
+    
+    if media_type == PLAN_PACKED and training_plan.storage == "packed" and window == DayWindow():
+        # The stored blob already is the hours section of the packed layout
+        with span("serialize"):
+            body = packed_plan_body(training_plan, None, None)
+        entry = response_cache.put(uin, variant, body, generation, media_type)
+        return cached_response(entry, if_none_match)
+    
+    with span("read"):
+        days = list(plan_days(db, training_plan, window))
+    next_cursor = None
+    if limit is not None and len(days) > limit:
+        days = days[:limit]
+        next_cursor = days[-1][0]
+    
+    zones = None
+    if expand:
+        with span("zones"):
+            zones = prescribe_zones(days, training_plan.competition_date, training_plan.difficulty)
+    
+    with span("serialize"):
+        if media_type != PLAN_JSON:
+            body = encode_plan(training_plan, days, next_cursor, media_type, zones)
+            entry = response_cache.put(uin, variant, body, generation, media_type)
+            return cached_response(entry, if_none_match)
+        if zones is not None:
+            response = plan_zones_response(training_plan, days, next_cursor, zones)
+        else:
+            response = TrainingPlanResponse(
+                id=training_plan.id,
+                competition_date=training_plan.competition_date,
+                difficulty=training_plan.difficulty,
+                training_days=[
+                    TrainingDayResponse(
+                        date=day,
+                        swimming_hours=swimming_hours,
+                        cycling_hours=cycling_hours,
+                        running_hours=running_hours,
+                        total_hours=total_hours
+                    )
+                    for day, swimming_hours, cycling_hours, running_hours, total_hours in days
+                ],
+                next_cursor=next_cursor,
+            )
+        body = response.model_dump_json().encode()
+    entry = response_cache.put(uin, variant, body, generation)
+    return cached_response(entry, if_none_match)
+
+def plan_zones_response(
+    training_plan: TrainingPlan, days: List[tuple], next_cursor: Optional[date], zones: PlanZones
+) -> TrainingPlanZonesResponse:
+    return TrainingPlanZonesResponse(
         id=training_plan.id,
         competition_date=training_plan.competition_date,
         difficulty=training_plan.difficulty,
         training_days=[
-            TrainingDayResponse(
-                date=day.date,
-                swimming_hours=day.swimming_hours,
-                cycling_hours=day.cycling_hours,
-                running_hours=day.running_hours,
-                total_hours=day.total_hours
+            TrainingDayZonesResponse(
+                date=day,
+                swimming_hours=swimming_hours,
+                cycling_hours=cycling_hours,
+                running_hours=running_hours,
+                total_hours=total_hours,
+                zones={sport: [column[position] for column in columns] for sport, columns in zones.hours.items()},
+                load=zones.load[position],
             )
-            for day in sorted(training_plan.training_days, key=lambda x: x.date)
-        ]
+            for position, (day, swimming_hours, cycling_hours, running_hours, total_hours) in enumerate(days)
+        ],
+        next_cursor=next_cursor,
     )
 
+def volume_summary(days: int, swimming_hours: float, cycling_hours: float, running_hours: float, total_hours: float) -> dict:
+    """Rounded totals and sport split percentages of a group of days"""
+    sports_total = swimming_hours + cycling_hours + running_hours
+    percentage = lambda hours: round(hours / sports_total * 100, 1) if sports_total else 0.0
+    return {
+        "days": days,
+        "swimming_hours": round(swimming_hours, 2),
+        "cycling_hours": round(cycling_hours, 2),
+        "running_hours": round(running_hours, 2),
+        "total_hours": round(total_hours, 2),
+        "swimming_percentage": percentage(swimming_hours),
+        "cycling_percentage": percentage(cycling_hours),
+        "running_percentage": percentage(running_hours),
+    }
+
+@app.get("/training-plan/{uin}/summary", response_model=TrainingPlanSummaryResponse)
+def get_training_plan_summary(uin: str, db: Session = Depends(get_db)):
+    """Weekly and per-phase training volume of a user's plan"""
+    
+    user = db.query(User).filter(User.uin == uin).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    training_plan = db.query(TrainingPlan).filter(TrainingPlan.user_id == user.id).first()
+    if not training_plan:
+        raise HTTPException(status_code=404, detail="No training plan found for this user")
+    
+    totals = (
+        func.sum(PlanWeekSummary.days),
+        func.sum(PlanWeekSummary.swimming_hours),
+        func.sum(PlanWeekSummary.cycling_hours),
+        func.sum(PlanWeekSummary.running_hours),
+        func.sum(PlanWeekSummary.total_hours),
+    )
+    weeks_query = (
+        select(PlanWeekSummary.week_start, PlanWeekSummary.weeks_out, *totals)
+        .where(PlanWeekSummary.training_plan_id == training_plan.id)
+        .group_by(PlanWeekSummary.week_start, PlanWeekSummary.weeks_out)
+        .order_by(PlanWeekSummary.week_start)
+    )
+    weeks = db.execute(weeks_query).all()
+    if not weeks:
+        # Plan written before summaries were maintained: aggregate its days once
+        summary_rows = week_summary_rows(
+            training_plan.id, plan_days(db, training_plan), training_plan.competition_date, training_plan.difficulty
+        )
+        if summary_rows:
+            db.execute(insert(PlanWeekSummary), summary_rows)
+            db.commit()
+            weeks = db.execute(weeks_query).all()
+    phases = db.execute(
+        select(PlanWeekSummary.weeks_out, func.min(PlanWeekSummary.week_start), func.count(), *totals)
+        .where(PlanWeekSummary.training_plan_id == training_plan.id)
+        .group_by(PlanWeekSummary.weeks_out)
+        .order_by(func.min(PlanWeekSummary.week_start))
+    ).all()
+    
+    return TrainingPlanSummaryResponse(
+        id=training_plan.id,
+        competition_date=training_plan.competition_date,
+        difficulty=training_plan.difficulty,
+        weeks=[
+            WeekSummaryResponse(week_start=week_start, weeks_out=weeks_out, **volume_summary(*volume))
+            for week_start, weeks_out, *volume in weeks
+        ],
+        phases=[
+            PhaseSummaryResponse(weeks_out=weeks_out, first_week=first_week, weeks=week_count, **volume_summary(*volume))
+            for weeks_out, first_week, week_count, *volume in phases
+        ],
+    )
+
+# Calendar export
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+EXPORT_COLUMNS = ("uin", "date", "swimming_hours", "cycling_hours", "running_hours", "total_hours")
+
+def export_plan_days(db: Session, uins: Optional[List[str]], window: DayWindow) -> Iterator[tuple]:
+    """(uin, date, swimming, cycling, running, total) of every athlete's plan, by uin then date.
+
+    Days of plans stored as rows come from one query over training_days joined to
+    their plan and user, walked with a server-side cursor alongside the cursor over
+    the plans. Lazy and packed plans are expanded as they are reached. Only the
+    first plan of a user is exported, as GET /training-plan/{uin} does.
+    """
+    plans_query = select(User.uin, TrainingPlan).join(TrainingPlan, TrainingPlan.user_id == User.id)
+    rows_query = (
+        select(
+            TrainingDay.training_plan_id,
+            TrainingDay.date,
+            TrainingDay.swimming_hours,
+            TrainingDay.cycling_hours,
+            TrainingDay.running_hours,
+            TrainingDay.total_hours,
+        )
+        .join(TrainingPlan, TrainingDay.training_plan_id == TrainingPlan.id)
+        .join(User, TrainingPlan.user_id == User.id)
+        .where((TrainingPlan.storage == "rows") | TrainingPlan.storage.is_(None))
+    )
+    if uins is not None:
+        plans_query = plans_query.where(User.uin.in_(uins))
+        rows_query = rows_query.where(User.uin.in_(uins))
+    if window.date_from is not None:
+        rows_query = rows_query.where(TrainingDay.date >= window.date_from)
+    if window.date_to is not None:
+        rows_query = rows_query.where(TrainingDay.date <= window.date_to)
+    # Both cursors list the plans in the same order, so the stored days of each
+    # plan are the next run of rows with its id
+    plans = db.execute(plans_query.order_by(User.uin, TrainingPlan.id).execution_options(yield_per=STREAM_CHUNK_DAYS))
+    rows = db.execute(
+        rows_query.order_by(User.uin, TrainingPlan.id, TrainingDay.date).execution_options(yield_per=STREAM_CHUNK_DAYS)
+    )
+    row = next(rows, None)
+    previous_uin = None
+    for uin, training_plan in plans:
+        exported = uin != previous_uin
+        previous_uin = uin
+        if (training_plan.storage or "rows") == "rows":
+            while row is not None and row.training_plan_id == training_plan.id:
+                if exported:
+                    yield (uin, *row[1:])
+                row = next(rows, None)
+        elif exported:
+            for day in plan_days(db, training_plan, window):
+                yield (uin, *day)
+
+def export_chunks(days: Iterator[tuple], format: str) -> Iterator[bytes]:
+    """Encode exported days as CSV or NDJSON, STREAM_CHUNK_DAYS days per chunk"""
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue().encode()
+    for rows in iter(lambda: list(islice(days, STREAM_CHUNK_DAYS)), []):
+        if format == "csv":
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows((uin, day.isoformat(), *hours) for uin, day, *hours in rows)
+            yield buffer.getvalue().encode()
+        else:
+            yield "".join(
+                json.dumps(dict(zip(EXPORT_COLUMNS, (uin, day.isoformat(), *hours)))) + "\n"
+                for uin, day, *hours in rows
+            ).encode()
+
+def ics_text(value: str) -> str:
+    """Escape a TEXT value (RFC 5545, 3.3.11)"""
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def ics_line(line: str) -> str:
+    """Fold a content line at 75 octets (RFC 5545, 3.1)"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74  # continuation lines start with a space
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1  # do not split a UTF-8 sequence
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    return "\r\n ".join(parts) + "\r\n"
+
+def ics_chunks(uin: str, days: Iterator[tuple]) -> Iterator[bytes]:
+    """iCalendar feed of a plan with one all-day event per training day"""
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    yield "".join(ics_line(line) for line in (
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Triathlon Training Service//Training Plan//EN",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{ics_text(f'Training plan {uin}')}",
+    )).encode()
+    for rows in iter(lambda: list(islice(days, STREAM_CHUNK_DAYS)), []):
+        lines = []
+        for _, day, swimming_hours, cycling_hours, running_hours, total_hours in rows:
+            if not total_hours:
+                continue  # rest day
+            lines.extend((
+                "BEGIN:VEVENT",
+                f"UID:{ics_text(f'{uin}-{day.isoformat()}')}@triathlon-training",
+                f"DTSTAMP:{stamp}",
+                f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}",
+                f"DTEND;VALUE=DATE:{(day + timedelta(days=1)).strftime('%Y%m%d')}",
+                f"SUMMARY:{ics_text(f'Training {total_hours:g} h')}",
+                "DESCRIPTION:" + ics_text(
+                    f"Swimming {swimming_hours:g} h, cycling {cycling_hours:g} h, running {running_hours:g} h"
+                ),
+                "END:VEVENT",
+            ))
+        yield "".join(ics_line(line) for line in lines).encode()
+    yield ics_line("END:VCALENDAR").encode()
+
+def stream_export(uins: Optional[List[str]], window: DayWindow, encode) -> Iterator[bytes]:
+    # The request session is closed once the endpoint returns, so the stream owns its own
+    db = SessionLocal()
+    try:
+        yield from encode(export_plan_days(db, uins, window))
+    finally:
+        db.close()
+
+@app.get("/training-plans/export")
+def export_training_plans(
+    format: str = Query("csv", description="csv or ndjson"),
+    uin: Optional[List[str]] = Query(None, description="Athletes to export, all when omitted"),
+    date_from: Optional[date] = Query(None, alias="from", description="First date to export"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last date to export"),
+):
+    """Training days of many athletes in one stream, ordered by uin and date
+
+    Rows are read with server-side cursors and written as they are read, so
+    memory use does not grow with the number of athletes.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    return StreamingResponse(
+        stream_export(uin, DayWindow(date_from, date_to), lambda days: export_chunks(days, format)),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="training-plans.{format}"'},
+    )
+
+@app.get("/training-plan/{uin}/calendar.ics")
+def get_training_plan_calendar(
+    uin: str,
+    date_from: Optional[date] = Query(None, alias="from", description="First date to include"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last date to include"),
+    db: Session = Depends(get_db),
+):
+    """iCalendar feed of a user's training plan, for calendar subscriptions"""
+    
+    user = db.query(User).filter(User.uin == uin).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if db.scalar(select(TrainingPlan.id).where(TrainingPlan.user_id == user.id).limit(1)) is None:
+        raise HTTPException(status_code=404, detail="No training plan found for this user")
+    
+    return StreamingResponse(
+        stream_export([uin], DayWindow(date_from, date_to), lambda days: ics_chunks(uin, days)),
+        media_type="text/calendar",
+    )
+
+@app.put("/training-plan/{uin}/days/{day}", response_model=TrainingDayResponse)
+def update_training_day(uin: str, day: date, hours: TrainingDayUpdate, db: Session = Depends(get_db)):
+    """Override the hours of one day of a user's training plan"""
+    
+    if min(hours.swimming_hours, hours.cycling_hours, hours.running_hours) < 0:
+        raise HTTPException(status_code=400, detail="Training hours must not be negative")
+    
+    user = db.query(User).filter(User.uin == uin).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    training_plan = db.query(TrainingPlan).filter(TrainingPlan.user_id == user.id).first()
+    if not training_plan:
+        raise HTTPException(status_code=404, detail="No training plan found for this user")
+    
+    previous = next(plan_days(db, training_plan, DayWindow(date_from=day, date_to=day)), None)
+    values = {
+        "swimming_hours": round(hours.swimming_hours, 2),
+        "cycling_hours": round(hours.cycling_hours, 2),
+        "running_hours": round(hours.running_hours, 2),
+        "total_hours": round(hours.swimming_hours + hours.cycling_hours + hours.running_hours, 2),
+    }
+    training_day = db.query(TrainingDay).filter(
+        TrainingDay.training_plan_id == training_plan.id,
+        TrainingDay.date == day,
+    ).first()
+    if training_day is not None:
+        for name, value in values.items():
+            setattr(training_day, name, value)
+    elif training_plan.storage == "lazy" and training_plan.start_date <= day < training_plan.competition_date:
+        db.add(TrainingDay(training_plan_id=training_plan.id, date=day, **values))
+    elif training_plan.storage == "packed" and training_plan.start_date <= day < training_plan.competition_date:
+        position = (day - training_plan.start_date).days
+        hour_columns = [[value / 100 for value in column] for column in unpack_plan_hours(training_plan.packed_days)]
+        for column, value in zip(hour_columns, values.values()):
+            column[position] = value
+        try:
+            training_plan.packed_days = pack_plan_hours(hour_columns)
+        except OverflowError:
+            raise HTTPException(status_code=400, detail=PACKED_OVERFLOW_DETAIL)
+    else:
+        raise HTTPException(status_code=404, detail="Training day not found in this plan")
+    if previous is not None:
+        adjust_week_summary(db, training_plan.id, day, previous[1:], tuple(values.values()))
+    
+    db.commit()
+    response_cache.invalidate(uin)
+    
+    return TrainingDayResponse(date=day, **values)
+
 @app.delete("/training-plan/{uin}")
-async def delete_training_plan(uin: str, db: Session = Depends(get_db)):
+def delete_training_plan(uin: str, db: Session = Depends(get_db)):
     """Delete training plan for a user"""
     
     user = db.query(User).filter(User.uin == uin).first()
@@ -365,18 +3100,145 @@ async def delete_training_plan(uin: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     
     # Delete training plans and associated days
-    plans = db.query(TrainingPlan).filter(TrainingPlan.user_id == user.id).all()
-    if not plans:
+    if not delete_user_plans(db, [user.id]):
         raise HTTPException(status_code=404, detail="No training plan found for this user")
     
-    for plan in plans:
-        db.query(TrainingDay).filter(TrainingDay.training_plan_id == plan.id).delete()
-        db.delete(plan)
-    
     db.commit()
+    response_cache.invalidate(uin)
     
     return {"message": "Training plan deleted successfully"}
 
+def current_template_set(db: Session) -> PeriodizationTemplateSetResponse:
+    index = get_periodization_index()
+    applied = db.scalars(
+        select(PeriodizationVersion)
+        .where(PeriodizationVersion.fingerprint == index.version)
+        .order_by(PeriodizationVersion.created_at.desc())
+        .limit(1)
+    ).first()
+    templates = db.query(PeriodizationTemplate).order_by(
+        PeriodizationTemplate.difficulty_min, PeriodizationTemplate.weeks_out.desc()
+    ).all()
+    return PeriodizationTemplateSetResponse(
+        version=applied.version if applied else index.version,
+        fingerprint=index.version,
+        created_at=applied.created_at if applied else None,
+        templates=[
+            PeriodizationTemplateData(
+                difficulty_min=template.difficulty_min,
+                difficulty_max=template.difficulty_max,
+                weeks_out=template.weeks_out,
+                swimming_percentage=template.swimming_percentage,
+                cycling_percentage=template.cycling_percentage,
+                running_percentage=template.running_percentage,
+                total_hours_per_week=template.total_hours_per_week,
+            )
+            for template in templates
+        ],
+    )
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    # Without a configured token template changes are disabled, not open to anyone
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Template changes are disabled: ADMIN_TOKEN is not set")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/periodization-templates", response_model=PeriodizationTemplateSetResponse)
+def get_periodization_templates(db: Session = Depends(get_db)):
+    """Periodization templates in use and their version"""
+    return current_template_set(db)
+
+@app.put(
+    "/periodization-templates",
+    response_model=PeriodizationTemplateSetResponse,
+    dependencies=[Depends(require_admin)],
+)
+def put_periodization_templates(template_set: PeriodizationTemplateSet, db: Session = Depends(get_db)):
+    """Validate a new template set and swap it in without a restart
+
+    Existing plans keep their days; plans computed on read are first stored
+    with the templates they were built from. Re-sending an applied version
+    changes nothing.
+    """
+    error = validate_template_set(template_set)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    conflict = template_version_conflict(db, template_set)
+    if conflict:
+        raise HTTPException(status_code=409, detail=conflict)
+    apply_template_set(db, template_set, "api")
+    return current_template_set(db)
+
+@app.post(
+    "/periodization-templates/reload",
+    response_model=PeriodizationTemplateSetResponse,
+    dependencies=[Depends(require_admin)],
+)
+def reload_periodization_templates(db: Session = Depends(get_db)):
+    """Apply PERIODIZATION_TEMPLATES_FILE if its version is new"""
+    try:
+        template_set = load_template_file()
+    except (OSError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=f"Cannot read templates file: {exc}")
+    error = validate_template_set(template_set)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    conflict = template_version_conflict(db, template_set)
+    if conflict:
+        raise HTTPException(status_code=409, detail=conflict)
+    apply_template_set(db, template_set, PERIODIZATION_TEMPLATES_FILE)
+    return current_template_set(db)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request, phase and cache metrics of this process in the Prometheus text format"""
+    lines = []
+    for histogram in (request_seconds, request_statements, phase_seconds):
+        lines.extend(histogram.render())
+    for name, cache in (("plan_cache", plan_cache), ("response_cache", response_cache), ("plan_library", plan_library)):
+        stats = cache.stats()
+        for outcome in ("hits", "misses"):
+            lines.append(f"# TYPE {name}_{outcome}_total counter")
+            lines.append(f"{name}_{outcome}_total {stats[outcome]}")
+    stats = plan_requests.stats()
+    for outcome in ("coalesced", "replayed"):
+        lines.append(f"# TYPE plan_requests_{outcome}_total counter")
+        lines.append(f"plan_requests_{outcome}_total {stats[outcome]}")
+    stats = plan_jobs.stats()
+    for outcome in ("completed", "failed"):
+        lines.append(f"# TYPE plan_jobs_{outcome}_total counter")
+        lines.append(f"plan_jobs_{outcome}_total {stats[outcome]}")
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/plan-jobs/stats")
+async def plan_jobs_stats():
+    """Background plan jobs completed and failed by this process"""
+    return plan_jobs.stats()
+
+@app.get("/plan-library/stats")
+def plan_library_stats(db: Session = Depends(get_db)):
+    """Hit/miss counters of the precomputed plan library and the races it holds"""
+    races = db.scalars(select(PlanLibraryEntry.race_date).distinct().order_by(PlanLibraryEntry.race_date)).all()
+    stats = plan_library.stats()
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+        "entries": db.scalar(select(func.count()).select_from(PlanLibraryEntry)),
+        "races": races,
+    }
+
+@app.get("/plan-cache/stats")
+async def plan_cache_stats():
+    """Hit/miss counters of the computed plan cache"""
+    return plan_cache.stats()
+
+@app.get("/response-cache/stats")
+async def response_cache_stats():
+    """Hit/miss counters of the serialized plan response cache"""
+    return response_cache.stats()
+
 @app.get("/")
 async def root():
     return {"message": "Triathlon Training Service based on Joe Friel's Training Bible"}
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Rebuild the precomputed plan library for the configured races.
+
+Uses the same environment as the service (DATABASE_URL, PLAN_LIBRARY_RACES,
+PLAN_LIBRARY_POPULAR_RACES, PERIODIZATION_TEMPLATES_FILE). Run it nightly, e.g. from cron:
+
+    5 0 * * * cd /app && python precompute_library.py
+"""
+
+from sqlalchemy import func, select
+
+import main
+
+
+def run():
+    # Seeds reference data and applies PERIODIZATION_TEMPLATES_FILE like the service
+    # does at startup, failing when no templates exist; builds the library when stale
+    index = main.bootstrap()
+    db = main.SessionLocal()
+    try:
+        races = main.plan_library_races(db)
+        if not main.plan_library_current(db, index):
+            main.precompute_plan_library(db)
+        entries = db.scalar(select(func.count()).select_from(main.PlanLibraryEntry))
+    finally:
+        db.close()
+    print(f"Plan library: {entries} entries for {len(races)} races")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Тесты API без запущенного сервера (FastAPI TestClient, отдельная база SQLite)
+
+pip install pytest "httpx<0.28"
+pytest test_api.py
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test_api.db")
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+
+import main
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def race_in(days: int) -> str:
+    return (date.today() + timedelta(days=days)).isoformat()
+
+
+def post_plan(client, uin: str, days: int, difficulty: int = 500, **kwargs):
+    return client.post(
+        "/training-plan", json={"uin": uin, "competition_date": race_in(days), "difficulty": difficulty}, **kwargs
+    )
+
+
+def server_timing(response) -> dict:
+    """Phase names of the Server-Timing header, plus the SQL statement count"""
+    phases = {}
+    for metric in response.headers["server-timing"].split(", "):
+        name, *params = metric.split(";")
+        phases[name] = params
+    phases["statements"] = int(phases["db"][-1].split("=")[-1].strip('"'))
+    return phases
+
+
+def stored_days(uin: str) -> dict:
+    """{date: (id, swimming, cycling, running, total)} of the rows stored for the plan of uin"""
+    with main.SessionLocal() as db:
+        rows = db.execute(
+            select(
+                main.TrainingDay.date,
+                main.TrainingDay.id,
+                main.TrainingDay.swimming_hours,
+                main.TrainingDay.cycling_hours,
+                main.TrainingDay.running_hours,
+                main.TrainingDay.total_hours,
+            )
+            .join(main.TrainingPlan, main.TrainingDay.training_plan_id == main.TrainingPlan.id)
+            .join(main.User, main.TrainingPlan.user_id == main.User.id)
+            .where(main.User.uin == uin)
+        )
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+
+# Updating a plan in place (sync_training_days)
+
+def test_identical_resubmit_writes_nothing(client):
+    assert post_plan(client, "sync-noop", 100).status_code == 200
+    etag = client.get("/training-plan/sync-noop").headers["etag"]
+    before = stored_days("sync-noop")
+
+    response = post_plan(client, "sync-noop", 100)
+
+    assert response.status_code == 200
+    timing = server_timing(response)
+    assert "commit" not in timing
+    # user, plan, extra plans, stored days, stored week summaries, plan refresh for the response
+    assert timing["statements"] == 6
+    assert stored_days("sync-noop") == before
+    assert client.get("/training-plan/sync-noop", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_moved_race_writes_only_changed_days(client):
+    # 100 and 93 days out both pick the 12 weeks out template, so the kept days are unchanged
+    post_plan(client, "sync-moved", 100)
+    before = stored_days("sync-moved")
+
+    response = post_plan(client, "sync-moved", 93)
+
+    assert response.status_code == 200
+    timing = server_timing(response)
+    assert "commit" in timing
+    # One DELETE for the days after the new race and one for the dropped week, one UPDATE
+    # for the weeks now in another phase, one plan UPDATE
+    assert timing["statements"] == 10
+    after = stored_days("sync-moved")
+    assert len(before) - len(after) == 7
+    assert after == {day: row for day, row in before.items() if day in after}
+    assert [day["date"] for day in response.json()["training_days"]] == [day.isoformat() for day in sorted(after)]
+
+
+def test_later_race_only_inserts_new_days(client):
+    post_plan(client, "sync-later", 300)
+    before = stored_days("sync-later")
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "training_days" in statement and not statement.startswith("SELECT"):
+            statements.append(statement.split(" ", 1)[0])
+
+    event.listen(main.engine, "before_cursor_execute", record)
+    try:
+        response = post_plan(client, "sync-later", 307)
+    finally:
+        event.remove(main.engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert statements == ["INSERT"]
+    after = stored_days("sync-later")
+    assert len(after) - len(before) == 7
+    assert {day: after[day] for day in before} == before
+
+
+def test_storage_switch_keeps_days(client, monkeypatch):
+    rows_plan = post_plan(client, "sync-storage", 60).json()
+    rows = stored_days("sync-storage")
+    assert len(rows) == 60
+
+    monkeypatch.setattr(main, "PLAN_STORAGE", "packed")
+    packed_plan = post_plan(client, "sync-storage", 60).json()
+    assert stored_days("sync-storage") == {}
+    assert packed_plan["training_days"] == rows_plan["training_days"]
+    assert client.get("/training-plan/sync-storage").json()["training_days"] == rows_plan["training_days"]
+
+    monkeypatch.setattr(main, "PLAN_STORAGE", "rows")
+    assert post_plan(client, "sync-storage", 60).json()["training_days"] == rows_plan["training_days"]
+    restored = stored_days("sync-storage")
+    assert sorted(restored) == sorted(rows)
+    assert [row[1:] for _, row in sorted(restored.items())] == [row[1:] for _, row in sorted(rows.items())]
+
+
+# Weekly and phase summaries
+
+def test_summary_labels_each_week_with_its_phase(client):
+    post_plan(client, "summary-phases", 200)
+    summary = client.get("/training-plan/summary-phases/summary").json()
+
+    index = main.get_periodization_index()
+    competition_date = date.fromisoformat(race_in(200))
+    for week in summary["weeks"]:
+        first_day = max(date.fromisoformat(week["week_start"]), date.today())
+        assert week["weeks_out"] == main.periodization_phase(first_day, competition_date, 500, index)
+    assert summary["weeks"][-1]["weeks_out"] == 1
+    phases = [phase["weeks_out"] for phase in summary["phases"]]
+    assert phases == sorted(phases, reverse=True) and len(phases) > 1
+    assert sum(phase["weeks"] for phase in summary["phases"]) == len(summary["weeks"])
+
+
+# Time in zones (expand=zones)
+
+def test_zones_follow_the_periodization_phase(client):
+    post_plan(client, "zones-phases", 200)
+    plan = client.get("/training-plan/zones-phases?expand=zones").json()
+
+    competition_date = date.fromisoformat(plan["competition_date"])
+    table = main.get_zone_table()
+    splits = set()
+    for day in plan["training_days"]:
+        # The phase function GET /training-plan/{uin}/summary labels its weeks with
+        phase = main.periodization_phase(date.fromisoformat(day["date"]), competition_date, 500)
+        splits.add(main.zone_split(phase))
+        for sport in main.SPORTS:
+            zones = day["zones"][sport]
+            assert round(sum(zones), 2) == day[f"{sport}_hours"]
+            assert zones == list(main.split_hours(day[f"{sport}_hours"], table.fractions(sport, main.zone_split(phase))))
+    assert len(splits) == len(main.PHASE_ZONE_WEIGHTS)
+
+
+# Idempotency-Key and in-flight coalescing
+
+class HeldSaves:
+    """Replaces save_training_plan with one that waits until released, counting calls"""
+
+    def __init__(self, monkeypatch):
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self._save = main.save_training_plan
+        monkeypatch.setattr(main, "save_training_plan", self)
+
+    def __call__(self, db, plan_data):
+        self.calls += 1
+        self.entered.set()
+        assert self.release.wait(10)
+        return self._save(db, plan_data)
+
+
+def wait_until(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_idempotency_key_replays_the_stored_response(client):
+    first = post_plan(client, "idem-replay", 100, headers={"Idempotency-Key": "idem-replay-1"})
+    replay = post_plan(client, "idem-replay", 100, headers={"Idempotency-Key": "idem-replay-1"})
+
+    assert first.status_code == replay.status_code == 200
+    assert replay.content == first.content
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    # Only the stored key is read
+    assert server_timing(replay)["statements"] == 1
+
+
+def test_idempotency_key_with_another_body_is_rejected(client):
+    post_plan(client, "idem-body", 100, headers={"Idempotency-Key": "idem-body-1"})
+    response = post_plan(client, "idem-body", 120, headers={"Idempotency-Key": "idem-body-1"})
+    assert response.status_code == 422
+
+
+def test_idempotency_key_replays_background_jobs(client):
+    first = post_plan(client, "idem-job", 100, params={"background": "true"}, headers={"Idempotency-Key": "idem-job-1"})
+    replay = post_plan(client, "idem-job", 100, params={"background": "true"}, headers={"Idempotency-Key": "idem-job-1"})
+    assert first.status_code == replay.status_code == 202
+    assert replay.json()["id"] == first.json()["id"]
+    assert replay.headers["location"] == first.headers["location"]
+
+
+def plan_fingerprint(uin: str, days: int) -> str:
+    return main.plan_request_fingerprint(
+        main.TrainingPlanCreate(uin=uin, competition_date=race_in(days), difficulty=500), False
+    )
+
+
+def test_key_in_progress_in_another_process_gets_409(client):
+    # A claimed key without a pending request in this process
+    with main.SessionLocal() as db:
+        db.add(main.IdempotencyKey(
+            key="idem-elsewhere", fingerprint=plan_fingerprint("idem-elsewhere", 100), created_at=datetime.utcnow()
+        ))
+        db.commit()
+
+    response = post_plan(client, "idem-elsewhere", 100, headers={"Idempotency-Key": "idem-elsewhere"})
+
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "1"
+
+
+def test_abandoned_key_is_taken_over(client):
+    fingerprint = plan_fingerprint("idem-abandoned", 100)
+    started = datetime.utcnow() - timedelta(seconds=main.IDEMPOTENCY_LOCK_SECONDS + 1)
+    with main.SessionLocal() as db:
+        db.add(main.IdempotencyKey(key="idem-abandoned", fingerprint=fingerprint, created_at=started))
+        db.commit()
+
+    response = post_plan(client, "idem-abandoned", 100, headers={"Idempotency-Key": "idem-abandoned"})
+
+    assert response.status_code == 200
+    with main.SessionLocal() as db:
+        assert db.get(main.IdempotencyKey, "idem-abandoned").body == response.content
+
+
+def test_failed_request_releases_its_key(client, monkeypatch):
+    def fail(db, plan_data):
+        raise RuntimeError("generation failed")
+
+    monkeypatch.setattr(main, "save_training_plan", fail)
+    with pytest.raises(RuntimeError):
+        post_plan(client, "idem-failed", 100, headers={"Idempotency-Key": "idem-failed"})
+    monkeypatch.undo()
+
+    response = post_plan(client, "idem-failed", 100, headers={"Idempotency-Key": "idem-failed"})
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+
+
+def test_concurrent_retries_with_a_key_share_one_generation(client, monkeypatch):
+    saves = HeldSaves(monkeypatch)
+    coalesced = main.plan_requests.stats()["coalesced"]
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(post_plan, client, "idem-join", 100, headers={"Idempotency-Key": "idem-join"})
+        assert saves.entered.wait(10)
+        # Each retry sees the key in progress and joins the request of this process instead of getting 409
+        retries = [
+            pool.submit(post_plan, client, "idem-join", 100, headers={"Idempotency-Key": "idem-join"})
+            for _ in range(3)
+        ]
+        wait_until(lambda: main.plan_requests.stats()["coalesced"] == coalesced + 3)
+        saves.release.set()
+        responses = [leader.result()] + [retry.result() for retry in retries]
+
+    assert [response.status_code for response in responses] == [200] * 4
+    assert len({response.content for response in responses}) == 1
+    assert saves.calls == 1
+
+
+def test_key_reused_with_another_body_in_flight_is_rejected(client, monkeypatch):
+    saves = HeldSaves(monkeypatch)
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(post_plan, client, "idem-race", 100, headers={"Idempotency-Key": "idem-race"})
+        assert saves.entered.wait(10)
+        other = pool.submit(post_plan, client, "idem-race", 120, headers={"Idempotency-Key": "idem-race"})
+        wait_until(lambda: other.done() or main.plan_requests.stats()["in_flight"] == 2)
+        saves.release.set()
+        assert leader.result().status_code == 200
+        assert other.result().status_code == 422
+    assert saves.calls == 1
+
+
+def test_concurrent_identical_requests_share_one_generation(client, monkeypatch):
+    saves = HeldSaves(monkeypatch)
+    coalesced = main.plan_requests.stats()["coalesced"]
+    with ThreadPoolExecutor(6) as pool:
+        futures = [pool.submit(post_plan, client, "inflight-same", 100) for _ in range(6)]
+        wait_until(lambda: main.plan_requests.stats()["coalesced"] == coalesced + 5)
+        saves.release.set()
+        responses = [future.result() for future in futures]
+
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.content for response in responses}) == 1
+    assert saves.calls == 1
+
+
+def test_concurrent_requests_for_one_uin_take_turns(client):
+    with ThreadPoolExecutor(6) as pool:
+        responses = list(pool.map(lambda difficulty: post_plan(client, "inflight-uin", 100, difficulty), range(100, 700, 100)))
+
+    assert {response.status_code for response in responses} == {200}
+    with main.SessionLocal() as db:
+        user = db.query(main.User).filter(main.User.uin == "inflight-uin").one()
+        plans = db.query(main.TrainingPlan).filter(main.TrainingPlan.user_id == user.id).all()
+    assert len(plans) == 1
+    assert len(stored_days("inflight-uin")) == 100